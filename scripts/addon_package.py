@@ -0,0 +1,21 @@
+# Lets the scripts in this folder import the modules of the add-on:
+#   from addon_package import register_addon_package
+#   register_addon_package()
+#   from src.projekt_anki_notetypes import ...
+
+import sys
+import types
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+ADDON_PATH = ROOT / "src" / "projekt_anki_notetypes"
+
+
+def register_addon_package() -> None:
+    # registers the add-on package without running its __init__.py, which needs a
+    # running Anki
+    if str(ROOT) not in sys.path:
+        sys.path.insert(0, str(ROOT))
+    package = types.ModuleType("src.projekt_anki_notetypes")
+    package.__path__ = [str(ADDON_PATH)]  # type: ignore
+    sys.modules["src.projekt_anki_notetypes"] = package
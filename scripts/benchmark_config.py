@@ -0,0 +1,103 @@
+# Measures how long the ConfigManager of the notetype config window needs with nested
+# and with flat storage for
+# - read in: setting the values of all settings of the notetypes and taking a snapshot
+# - save: getting the values of all settings and comparing them with the snapshot
+# - copy / snapshot: copying the whole config
+# Needs anki and aqt to be installed. Run from the repository root:
+# python scripts/benchmark_config.py [notetype name ...]
+
+import sys
+import time
+from unittest import mock
+
+from addon_package import register_addon_package
+
+register_addon_package()
+
+from src.projekt_anki_notetypes.ankiaddonconfig import manager
+from src.projekt_anki_notetypes.ankiaddonconfig.manager import ConfigManager
+from src.projekt_anki_notetypes.notetype_setting import NotetypeSetting
+from src.projekt_anki_notetypes.notetype_setting_definitions import (
+    projekt_anki_notetype_model,
+    projekt_anki_notetype_names,
+    setting_configs,
+)
+
+REPEATS = 20
+
+
+def config_manager(flat):
+    # the config of the add-on is not used by the config window
+    with mock.patch.object(manager, "mw") as mw:
+        mw.addonManager.getConfig.return_value = dict()
+        return ConfigManager(flat=flat)
+
+
+def run_read_in(conf, values_by_notetype, ntss_by_notetype):
+    for values in values_by_notetype.values():
+        for key, value in values.items():
+            conf.set(key, value, on_change_trigger=False)
+    return conf.snapshot()
+
+
+def run_save(conf, values_by_notetype, ntss_by_notetype, snapshot):
+    # like NotetypesConfigWindow._apply_setting_changes_for_all_notetypes
+    for notetype_name, ntss in ntss_by_notetype.items():
+        conf.changed_keys(snapshot, prefix=f"{notetype_name}.")
+        for nts in ntss:
+            nts.conf_value(notetype_name, conf)
+
+
+def measure(func, make_args):
+    durations = []
+    for _ in range(REPEATS):
+        args = make_args()
+        start = time.perf_counter()
+        func(*args)
+        durations.append(time.perf_counter() - start)
+    return min(durations)
+
+
+notetype_names = sys.argv[1:] or projekt_anki_notetype_names()
+ntss_by_notetype = dict()
+values_by_notetype = dict()
+for notetype_name in notetype_names:
+    model = projekt_anki_notetype_model(notetype_name)
+    ntss = [
+        nts
+        for nts in (
+            NotetypeSetting.from_config(config) for config in setting_configs.values()
+        )
+        if nts.is_present(model)
+    ]
+    ntss_by_notetype[notetype_name] = ntss
+    values_by_notetype[notetype_name] = {
+        nts.key(notetype_name): nts.setting_value(model) for nts in ntss
+    }
+
+settings_count = sum(len(values) for values in values_by_notetype.values())
+print(f"{len(notetype_names)} notetypes, {settings_count} settings")
+for flat in (False, True):
+    print("flat" if flat else "nested")
+    conf = config_manager(flat)
+    snapshot = run_read_in(conf, values_by_notetype, ntss_by_notetype)
+    # one changed setting per notetype, so that the values have to be compared
+    for notetype_name, values in values_by_notetype.items():
+        key = next(iter(values), None)
+        if key is not None:
+            conf.set(key, "changed", on_change_trigger=False)
+
+    durations = {
+        "read in": measure(
+            run_read_in,
+            lambda: (config_manager(flat), values_by_notetype, ntss_by_notetype),
+        ),
+        "save": measure(
+            run_save,
+            lambda: (conf, values_by_notetype, ntss_by_notetype, snapshot),
+        ),
+        "copy": measure(conf.copy, lambda: ()),
+        "snapshot": measure(conf.snapshot, lambda: ()),
+    }
+    for name, duration in durations.items():
+        print(f"  {name:10} {duration * 1000:8.3f} ms")
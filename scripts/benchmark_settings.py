@@ -0,0 +1,81 @@
+# Measures how long applying all settings to the shipped notetypes takes and how much
+# memory it needs at most:
+# - deepcopy + updated_model: what saving did before updated_model stopped deep copying
+# - updated_model: one copy of the templates per setting
+# - apply_settings: no copies
+# Needs anki and aqt to be installed. Run from the repository root:
+# python scripts/benchmark_settings.py [notetype name ...]
+
+import sys
+import time
+import tracemalloc
+from copy import deepcopy
+
+from addon_package import register_addon_package
+
+register_addon_package()
+
+from src.projekt_anki_notetypes.notetype_setting import (
+    NotetypeSetting,
+    apply_settings,
+)
+from src.projekt_anki_notetypes.notetype_setting_definitions import (
+    projekt_anki_notetype_model,
+    projekt_anki_notetype_names,
+    setting_configs,
+)
+
+
+def run_deepcopy_and_updated_model(model, ntss, conf, notetype_name):
+    for nts in ntss:
+        model.update(nts.updated_model(deepcopy(model), notetype_name, conf))
+
+
+def run_updated_model(model, ntss, conf, notetype_name):
+    for nts in ntss:
+        model.update(nts.updated_model(model, notetype_name, conf))
+
+
+def run_apply_settings(model, ntss, conf, notetype_name):
+    apply_settings(model, {nts.name(): conf[nts.key(notetype_name)] for nts in ntss})
+
+
+def measure(func, model, ntss, conf, notetype_name):
+    durations = []
+    for _ in range(3):
+        model_copy = deepcopy(model)
+        start = time.perf_counter()
+        func(model_copy, ntss, conf, notetype_name)
+        durations.append(time.perf_counter() - start)
+
+    # tracemalloc slows everything down, so memory is measured in a separate run
+    model_copy = deepcopy(model)
+    tracemalloc.start()
+    func(model_copy, ntss, conf, notetype_name)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return min(durations), peak
+
+
+for notetype_name in sys.argv[1:] or projekt_anki_notetype_names():
+    model = projekt_anki_notetype_model(notetype_name)
+    ntss = [
+        nts
+        for nts in (
+            NotetypeSetting.from_config(config) for config in setting_configs.values()
+        )
+        if nts.is_present(model)
+    ]
+    conf = {nts.key(notetype_name): nts.setting_value(model) for nts in ntss}
+
+    print(f"{notetype_name} ({len(model['tmpls'])} templates, {len(ntss)} settings)")
+    for func in (
+        run_deepcopy_and_updated_model,
+        run_updated_model,
+        run_apply_settings,
+    ):
+        duration, peak = measure(func, model, ntss, conf, notetype_name)
+        print(
+            f"  {func.__name__[len('run_'):]:27} {duration * 1000:8.1f} ms"
+            f"  peak memory {peak / 1024:8.0f} KiB"
+        )
@@ -0,0 +1,49 @@
+# Builds the notetype bundle (see notetype_bundle.py) from the files in note_types.
+# Run from the repository root: python scripts/build_notetype_bundle.py [--release]
+# The bundle is written into the add-on folder and is not part of the repository,
+# the release workflow adds it to the .ankiaddon file.
+# Without --release the add-on ignores the bundle once a notetype file was changed,
+# a release bundle is used without checking the notetype files.
+
+import sys
+
+from addon_package import ADDON_PATH, register_addon_package
+
+register_addon_package()
+
+from src.projekt_anki_notetypes import notetype_setting_definitions as defs
+from src.projekt_anki_notetypes.notetype_bundle import BUNDLE_FILE_NAME, write_bundle
+
+# the bundle has to be built from the notetype files, not from an older bundle
+defs.notetype_registry.bundle_path = None
+defs.notetype_registry.clear()
+
+notetypes = dict()
+for notetype_name in defs.projekt_anki_notetype_names():
+    front, back, css = defs.notetype_registry.templates(notetype_name)
+    notetypes[notetype_name] = {
+        "front": front,
+        "back": back,
+        "css": css,
+        "model": (
+            defs.PROJEKT_ANKI_NOTETYPES_PATH
+            / notetype_name
+            / f"{notetype_name}.json"
+        ).read_text(encoding="utf-8", errors="ignore"),
+        "version": defs.projekt_anki_notetype_version(notetype_name),
+        "configurable_fields": defs.configurable_fields_for_notetype(notetype_name),
+        "button_shortcuts": list(
+            defs.btn_name_to_shortcut_odict(notetype_name).items()
+        ),
+        "content_hashes": defs.notetype_registry.content_hashes(notetype_name),
+    }
+
+bundle_path = ADDON_PATH / BUNDLE_FILE_NAME
+write_bundle(
+    bundle_path,
+    defs.PROJEKT_ANKI_NOTETYPES_PATH,
+    notetypes,
+    list(defs.all_btns_setting_configs().items()),
+    record_sources="--release" not in sys.argv[1:],
+)
+print(f"wrote {bundle_path} ({bundle_path.stat().st_size} bytes)")
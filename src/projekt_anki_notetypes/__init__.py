@@ -15,6 +15,7 @@ from aqt.gui_hooks import (
     card_layout_will_show,
     profile_did_open,
     editor_will_show_context_menu,
+    operation_did_execute,
 )
 from aqt.qt import QMenu, QPushButton, qtmajor, QAction, qconnect
 from aqt.utils import askUserDialog, tooltip, openLink
@@ -25,18 +26,22 @@ from .compat import add_compat_aliases
 from .gui.config_window import (
     NotetypesConfigWindow,
     models_with_available_updates,
-    note_type_version,
 )
 from .gui.menu import setup_menu
 from .gui.utils import choose_subset
 from .notetype_setting_definitions import (
     HINT_BUTTONS,
-    projekt_anki_notetype_models,
+    projekt_anki_notetype_names,
+    projekt_anki_notetype_version,
 )
+from .notetype_versions import notetype_version_index, on_operation_did_execute
+from .settings_cache import SETTINGS_CACHE_FILE_NAME, enable_settings_cache
 
 ADDON_DIR_NAME = str(Path(__file__).parent.name)
 ADDON_VERSION = "5.4"
 RESOURCES_PATH = Path(__file__).parent / "resources"
+# the user_files folder is kept by Anki when the add-on is updated
+USER_FILES_PATH = Path(__file__).parent / "user_files"
 
 from .butler.init import init_butler
 
@@ -48,15 +53,19 @@ def setup_butler():
 
 def setup():
     add_compat_aliases()
+    enable_settings_cache(USER_FILES_PATH / SETTINGS_CACHE_FILE_NAME, ADDON_VERSION)
     setup_menu(open_window)
     card_layout_will_show.append(add_button_to_clayout)
     replace_default_addon_config_action()
     profile_did_open.append(on_profile_did_open)
     browser_will_show_context_menu.append(on_browser_will_show_context_menu)
     editor_will_show_context_menu.append(on_editor_will_show_context_menu)
+    operation_did_execute.append(on_operation_did_execute)
 
 
 def on_profile_did_open():
+    # another collection could have been opened
+    notetype_version_index.invalidate()
     copy_resources_into_media_folder()
     maybe_show_notetypes_update_notice()
     maybe_show_deck_update_notice()
@@ -90,7 +99,9 @@ def maybe_show_notetypes_update_notice():
         return
 
     # Return early if user was already notified about this version (and didn't choose "Remind me later")
-    latest_version = note_type_version(projekt_anki_notetype_models()[0])
+    latest_version = projekt_anki_notetype_version(
+        projekt_anki_notetype_names()[0]
+    )
 
     conf = mw.addonManager.getConfig(ADDON_DIR_NAME)
     if latest_version == conf.get("latest_notified_note_type_version"):
@@ -1,7 +1,9 @@
 import copy
 import json
+from collections import OrderedDict, defaultdict
+from contextlib import contextmanager
 from sys import platform
-from typing import Any, Callable, Dict, Iterator, List, Optional
+from typing import Any, Callable, DefaultDict, Dict, Iterator, List, Optional, Set
 
 from aqt import mw
 from aqt.qt import Qt
@@ -9,12 +11,52 @@ from aqt.qt import Qt
 from .window import ConfigWindow
 
 
+class ConfigSnapshot:
+    """The config values of a ConfigManager at one point in time, see
+    ConfigManager.snapshot."""
+
+    __slots__ = ("_values", "_flat")
+
+    def __init__(self, values: Dict, flat: bool):
+        self._values = values
+        self._flat = flat
+
+    def get(self, key: str, default: Any = None) -> Any:
+        if self._flat:
+            return _flat_get(self._values, key, default)
+        try:
+            return _get_from_dict(self._values, key)
+        except KeyError:
+            return default
+
+
 class ConfigManager:
-    def __init__(self) -> None:
+    """flat: the values are kept in one dict keyed by the full keys (e.g.
+    "ProjektAnkiCloze.font_size"), so that get and set don't have to walk nested
+    dicts and snapshots don't have to copy the values.
+    Getting a key that has keys below it (e.g. "ProjektAnkiCloze") returns a new nested
+    dict and lists can't be indexed with keys then. Values must not be changed in place,
+    set a new value instead."""
+
+    def __init__(self, flat: bool = False) -> None:
         self.config_window: Optional[ConfigWindow] = None
         self.window_open_hooks: List[Callable[[ConfigWindow], None]] = []
+        # hooks called for all changes
         self.change_hooks: List[Callable] = []
+        # hooks called for changes of one key / of the keys starting with a prefix
+        self._key_change_hooks: DefaultDict[str, List[Callable]] = defaultdict(list)
+        self._prefix_change_hooks: DefaultDict[str, List[Callable]] = defaultdict(list)
+        # see batch
+        self._batch_depth = 0
+        # key -> value before the first change in the batch
+        self._batch_old_values: "OrderedDict[str, Any]" = OrderedDict()
+        self._batch_callbacks: "OrderedDict[Callable[[], None], None]" = OrderedDict()
         self._config: Dict
+        self._flat = flat
+        # whether _config is shared with a snapshot and has to be copied before writing
+        self._config_shared = False
+        # flat mode: keys that have keys below them, e.g. "ProjektAnkiCloze"
+        self._parent_keys: Set[str] = set()
         addon_dir = __name__.split(".", maxsplit=1)[0]
         self.addon_dir = addon_dir
         try:
@@ -25,36 +67,127 @@ class ConfigManager:
 
     def load(self) -> None:
         "Loads config from disk"
-        self._config = mw.addonManager.getConfig(self.addon_dir)
+        config = mw.addonManager.getConfig(self.addon_dir)
+        self._config = _flatten(config) if self._flat else config
+        self._config_shared = False
+        self._parent_keys = _parent_keys(self._config) if self._flat else set()
 
     def save(self) -> None:
         "Writes its config data to disk."
-        mw.addonManager.writeConfig(self.addon_dir, self._config)
+        mw.addonManager.writeConfig(self.addon_dir, self._nested_config())
 
     def to_json(self) -> str:
-        return json.dumps(self._config)
+        return json.dumps(self._nested_config())
 
     def get_from_dict(self, dict_obj: dict, key: str) -> Any:
         "Raises KeyError if config doesn't exist"
-        levels = key.split(".")
-        return_val = dict_obj
-        for level in levels:
-            if isinstance(return_val, list):
-                level = int(level)
-            return_val = return_val[level]
-        return return_val
+        return _get_from_dict(dict_obj, key)
 
     def copy(self) -> Dict:
-        return copy.deepcopy(self._config)
+        return copy.deepcopy(self._nested_config())
+
+    def snapshot(self) -> ConfigSnapshot:
+        """Returns the current values, e.g. to restore them when changes are cancelled.
+        In flat mode the snapshot shares the values with the config until the config is
+        changed the next time, so taking a snapshot is cheap."""
+        if not self._flat:
+            return ConfigSnapshot(copy.deepcopy(self._config), flat=False)
+        self._config_shared = True
+        return ConfigSnapshot(self._config, flat=True)
+
+    def restore(self, snapshot: ConfigSnapshot) -> None:
+        # sets the values of the snapshot without calling the change hooks
+        if snapshot._flat != self._flat:
+            raise ValueError("snapshot was taken in another storage mode")
+        if self._flat:
+            self._config = snapshot._values
+            self._config_shared = True
+            self._parent_keys = _parent_keys(self._config)
+        else:
+            self._config = copy.deepcopy(snapshot._values)
+
+    def changed_keys(self, snapshot: ConfigSnapshot, prefix: str = "") -> Set[str]:
+        # full keys starting with prefix whose values were changed, added or removed
+        # since the snapshot was taken
+        if snapshot._flat != self._flat:
+            raise ValueError("snapshot was taken in another storage mode")
+        if self._flat:
+            if snapshot._values is self._config:
+                return set()
+            values, old_values = self._config, snapshot._values
+        else:
+            values, old_values = _flatten(self._config), _flatten(snapshot._values)
+        return {
+            key
+            for key in values.keys() | old_values.keys()
+            if key.startswith(prefix)
+            and values.get(key, _MISSING) != old_values.get(key, _MISSING)
+        }
 
     def get(self, key: str, default: Any = None) -> Any:
         "Returns default or None if config doesn't exist"
+        if self._flat:
+            return _flat_get(self._config, key, default, self._parent_keys)
         try:
             return self.get_from_dict(self._config, key)
         except KeyError:
             return default
 
     def set(self, key: str, value: Any, on_change_trigger: bool = True) -> None:
+        if self._flat:
+            old_value = self._flat_set(key, value)
+        else:
+            old_value = self._nested_set(key, value)
+
+        if not on_change_trigger:
+            return
+        if self._batch_depth > 0:
+            # the hooks are called when the batch ends, with the value at that time
+            if key not in self._batch_old_values:
+                self._batch_old_values[key] = old_value
+        elif value != old_value:
+            self._call_change_hooks(key, value)
+
+    def _flat_set(self, key: str, value: Any) -> Any:
+        # returns the old value
+        if self._config_shared:
+            # the values themselves are not changed in place, so they can be shared
+            self._config = dict(self._config)
+            self._config_shared = False
+        if not isinstance(value, dict) and key not in self._parent_keys:
+            # the usual case, a single value is set
+            if key not in self._config:
+                self._parent_keys.update(_parent_keys({key: value}))
+            old_value = self._config.get(key)
+            self._config[key] = value
+            return old_value
+
+        old_value = self._flat_pop(key)
+        values = (
+            _flatten(value, prefix=f"{key}.")
+            if isinstance(value, dict)
+            else {key: value}
+        )
+        self._config.update(values)
+        self._parent_keys.update(_parent_keys(values))
+        return old_value
+
+    def _flat_pop(self, key: str) -> Any:
+        if self._config_shared:
+            self._config = dict(self._config)
+            self._config_shared = False
+        if key in self._config:
+            return self._config.pop(key)
+        result = _flat_get(self._config, key, None, self._parent_keys)
+        if key in self._parent_keys:
+            prefix = f"{key}."
+            for sub_key in [k for k in self._config if k.startswith(prefix)]:
+                del self._config[sub_key]
+            self._parent_keys = _parent_keys(self._config)
+        return result
+
+    def _nested_set(self, key: str, value: Any) -> Any:
+        # returns the old value
         levels = key.split(".")
         conf_obj = self._config
         for i in range(len(levels) - 1):
@@ -72,12 +205,61 @@ class ConfigManager:
 
         old_value = conf_obj.get(level, None)
         conf_obj[level] = value
+        return old_value
+
+    def _nested_config(self) -> Dict:
+        return _unflatten(self._config) if self._flat else self._config
 
-        if on_change_trigger and value != old_value:
-            for hook in self.change_hooks:
-                hook(key, value)
+    def _call_change_hooks(self, key: str, value: Any) -> None:
+        hooks = list(self.change_hooks)
+        hooks.extend(self._key_change_hooks.get(key, ()))
+        prefix = key
+        while "." in prefix:
+            prefix = prefix.rsplit(".", 1)[0]
+            hooks.extend(self._prefix_change_hooks.get(prefix, ()))
+        for hook in hooks:
+            hook(key, value)
+
+    @contextmanager
+    def batch(self) -> Iterator[None]:
+        """Changes made inside the with block call the change hooks when the block ends,
+        once per changed key and with the final value. Keys that have the same value at
+        the end of the block as before it don't call the hooks.
+        The callbacks passed to run_after_batch are called after that, once each.
+        Batches can be nested, the hooks are called when the outermost one ends."""
+        self._batch_depth += 1
+        try:
+            yield
+        finally:
+            if self._batch_depth == 1:
+                self._end_batch()
+            self._batch_depth -= 1
+
+    def run_after_batch(self, fn: Callable[[], None]) -> None:
+        # calls fn when the current batch ends, or now if there is no batch
+        if self._batch_depth > 0:
+            self._batch_callbacks[fn] = None
+        else:
+            fn()
+
+    def _end_batch(self) -> None:
+        # changes made by the hooks and callbacks are collected too and delivered in
+        # the next round
+        while self._batch_old_values or self._batch_callbacks:
+            old_values = self._batch_old_values
+            self._batch_old_values = OrderedDict()
+            for key, old_value in old_values.items():
+                value = self.get(key)
+                if value != old_value:
+                    self._call_change_hooks(key, value)
+
+            if not self._batch_old_values and self._batch_callbacks:
+                fn, _ = self._batch_callbacks.popitem(last=False)
+                fn()
 
     def pop(self, key: str) -> Any:
+        if self._flat:
+            return self._flat_pop(key)
         levels = key.split(".")
         conf_obj = self._config
         for i in range(len(levels) - 1):
@@ -101,12 +283,17 @@ class ConfigManager:
         self.set(key, value)
 
     def __iter__(self) -> Iterator:
-        return iter(self._config)
+        return iter(self._nested_config())
 
     def __delitem__(self, key: str) -> Any:
         self.pop(key)
 
     def __contains__(self, key: str) -> bool:
+        if self._flat:
+            return (
+                _flat_get(self._config, key, _MISSING, self._parent_keys)
+                is not _MISSING
+            )
         try:
             self.get_from_dict(self._config, key)
             return True
@@ -140,8 +327,97 @@ class ConfigManager:
 
     add_config_tab = on_window_open
 
-    def on_change(self, fn: Callable[[str, Any], None]) -> None:
-        self.change_hooks.append(fn)
+    def on_change(
+        self,
+        fn: Callable[[str, Any], None],
+        key: Optional[str] = None,
+        prefix: Optional[str] = None,
+    ) -> None:
+        """fn is called with the key and the new value when a config value changes.
+        If key is given, only for changes of that key, if prefix is given, only for
+        changes of keys starting with prefix + "."."""
+        if key is not None:
+            self._key_change_hooks[key].append(fn)
+        elif prefix is not None:
+            self._prefix_change_hooks[prefix].append(fn)
+        else:
+            self.change_hooks.append(fn)
 
     def remove_on_change_hook(self, fn: Callable[[str, Any], None]) -> None:
-        self.change_hooks.remove(fn)
+        # raises ValueError if fn is not registered
+        for hooks in (
+            self.change_hooks,
+            *self._key_change_hooks.values(),
+            *self._prefix_change_hooks.values(),
+        ):
+            if fn in hooks:
+                hooks.remove(fn)
+                return
+        raise ValueError("change hook is not registered")
+
+
+_MISSING = object()
+
+
+def _get_from_dict(dict_obj: dict, key: str) -> Any:
+    levels = key.split(".")
+    return_val = dict_obj
+    for level in levels:
+        if isinstance(return_val, list):
+            level = int(level)
+        return_val = return_val[level]
+    return return_val
+
+
+def _flatten(config: Dict, prefix: str = "") -> Dict[str, Any]:
+    # nested dicts -> full key -> value, empty dicts are left out
+    result: Dict[str, Any] = dict()
+    for name, value in config.items():
+        if isinstance(value, dict):
+            result.update(_flatten(value, prefix=f"{prefix}{name}."))
+        else:
+            result[f"{prefix}{name}"] = value
+    return result
+
+
+def _unflatten(values: Dict[str, Any]) -> Dict:
+    result: Dict = dict()
+    for key, value in values.items():
+        *levels, last_level = key.split(".")
+        conf_obj = result
+        for level in levels:
+            conf_obj = conf_obj.setdefault(level, dict())
+        conf_obj[last_level] = value
+    return result
+
+
+def _parent_keys(values: Dict[str, Any]) -> Set[str]:
+    result = set()
+    for key in values:
+        levels = key.split(".")
+        for i in range(1, len(levels)):
+            result.add(".".join(levels[:i]))
+    return result
+
+
+def _flat_get(
+    values: Dict[str, Any],
+    key: str,
+    default: Any,
+    parent_keys: Optional[Set[str]] = None,
+) -> Any:
+    # parent_keys are the keys that have keys below them, if they are not given all
+    # keys are searched when key is not in values
+    try:
+        return values[key]
+    except KeyError:
+        if parent_keys is not None and key not in parent_keys:
+            return default
+    # the values of the keys below key as a nested dict
+    prefix = f"{key}."
+    sub_values = {
+        sub_key[len(prefix) :]: value
+        for sub_key, value in values.items()
+        if sub_key.startswith(prefix)
+    }
+    return _unflatten(sub_values) if sub_values else default
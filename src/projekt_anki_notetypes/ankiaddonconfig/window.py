@@ -1,5 +1,16 @@
 from pathlib import Path
-from typing import TYPE_CHECKING, Callable, List, Optional, Tuple, Union
+from collections import defaultdict
+from typing import (
+    TYPE_CHECKING,
+    Callable,
+    DefaultDict,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
 
 from aqt import mw
 from aqt.qt import (
@@ -42,7 +53,7 @@ from .collapsible_section import CollapsibleSection
 from .errors import InvalidConfigValueError
 
 if TYPE_CHECKING:
-    from .manager import ConfigManager
+    from .manager import ConfigManager, ConfigSnapshot
 
 QT6 = QT_VERSION_STR.split(".")[0] == "6"
 
@@ -53,10 +64,28 @@ class ConfigWindow(QDialog):
         self.conf = conf
         self.mgr = mw.addonManager
         self.widget_updates: List[Callable[[], None]] = []
+        # config key -> updates of the widgets for the key
+        self.widget_updates_by_key: DefaultDict[
+            str, List[Callable[[], None]]
+        ] = defaultdict(list)
+        # keys of the widgets to update when the current batch of changes ends
+        self._queued_widget_update_keys: Dict[str, None] = dict()
         self.should_save_hook: List[Callable[[], bool]] = []
         self._on_save_hook: List[Callable[[], None]] = []
         self._on_close_hook: List[Callable[[], None]] = []
         self.geom_key = f"addonconfig-{conf.addon_name}"
+        # the config as it was saved last, restored when the window is closed
+        self._saved_config: Optional["ConfigSnapshot"] = None
+        # tabs that are not built yet -> (layout, placeholder, build, is_ready)
+        self._lazy_tabs: Dict[
+            QWidget,
+            Tuple[
+                "ConfigLayout",
+                QLabel,
+                Callable[["ConfigLayout"], None],
+                Callable[[], bool],
+            ],
+        ] = {}
 
         self.setWindowTitle(f"Config for {conf.addon_name}")
         self.setAttribute(Qt.WidgetAttribute.WA_DeleteOnClose)
@@ -77,6 +106,7 @@ class ConfigWindow(QDialog):
         # Change the default for macOS
         main_tab.setElideMode(Qt.TextElideMode.ElideNone)
         main_tab.setUsesScrollButtons(True)
+        main_tab.currentChanged.connect(self._on_current_tab_changed)  # type: ignore
 
         self.main_layout.addWidget(main_tab)
         self.setup_buttons(self.btn_layout)
@@ -94,14 +124,35 @@ class ConfigWindow(QDialog):
         self.save_btn.clicked.connect(self.on_save)  # type: ignore
         btn_box.addWidget(self.save_btn)
 
-    def update_widgets(self) -> None:
-        for widget_update in self.widget_updates:
+    def update_widgets(self, keys: Optional[Iterable[str]] = None) -> None:
+        # updates the widgets for the keys, or all widgets if keys is None
+        if keys is None:
+            widget_updates = self.widget_updates
+        else:
+            widget_updates = [
+                widget_update
+                for key in keys
+                for widget_update in self.widget_updates_by_key.get(key, ())
+            ]
+        for widget_update in widget_updates:
             try:
                 widget_update()
             except InvalidConfigValueError:
                 pass
 
+    def queue_widget_updates(self, keys: Iterable[str]) -> None:
+        # updates the widgets for the keys when the current batch of config changes
+        # ends (see ConfigManager.batch), once for all keys queued in the batch
+        self._queued_widget_update_keys.update(dict.fromkeys(keys))
+        self.conf.run_after_batch(self._update_queued_widgets)
+
+    def _update_queued_widgets(self) -> None:
+        keys = self._queued_widget_update_keys
+        self._queued_widget_update_keys = dict()
+        self.update_widgets(keys)
+
     def on_open(self) -> None:
+        self._saved_config = self.conf.snapshot()
         self.update_widgets()
         restoreGeom(self, self.geom_key)
 
@@ -112,6 +163,7 @@ class ConfigWindow(QDialog):
         for hook in self._on_save_hook:
             hook()
         self.conf.save()
+        self._saved_config = self.conf.snapshot()
         self.close()
 
     def on_cancel(self) -> None:
@@ -126,7 +178,11 @@ class ConfigWindow(QDialog):
         # and also in case the window was clicked without clicking any of the buttons
         for hook in self._on_close_hook:
             hook()
-        self.conf.load()
+        if self._saved_config is not None:
+            # same as loading the config from disk again, without reading the file
+            self.conf.restore(self._saved_config)
+        else:
+            self.conf.load()
         saveGeom(self, self.geom_key)
         evt.accept()
 
@@ -142,6 +198,58 @@ class ConfigWindow(QDialog):
             self.main_tab.insertTab(index, tab, name)
         return layout
 
+    def add_lazy_tab(
+        self,
+        name: str,
+        build: Callable[["ConfigLayout"], None],
+        index=None,
+        is_ready: Callable[[], bool] = lambda: True,
+    ) -> None:
+        """The tab content is added by build when the tab is shown for the first time.
+        Until is_ready returns True the placeholder stays, call build_current_tab then."""
+        tab = QWidget(self)
+        layout = ConfigLayout(self, QBoxLayout.Direction.TopToBottom)
+        tab.setLayout(layout)
+        placeholder = QLabel("Wird geladen...")
+        placeholder.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        layout.addWidget(placeholder)
+        self._lazy_tabs[tab] = (layout, placeholder, build, is_ready)
+        # adding the first tab makes it the current one, which builds it
+        if index is None:
+            self.main_tab.addTab(tab, name)
+        else:
+            self.main_tab.insertTab(index, tab, name)
+
+    def remove_tab(self, index: int) -> None:
+        # also forgets the build of the tab if it was not built yet
+        self._lazy_tabs.pop(self.main_tab.widget(index), None)
+        self.main_tab.removeTab(index)
+
+    def build_current_tab(self) -> None:
+        # builds the current tab if it was not built because it was not ready
+        self._on_current_tab_changed(self.main_tab.currentIndex())
+
+    def _on_current_tab_changed(self, index: int) -> None:
+        tab = self.main_tab.widget(index)
+        if tab is None or tab not in self._lazy_tabs:
+            return
+
+        layout, placeholder, build, is_ready = self._lazy_tabs[tab]
+        if not is_ready():
+            return
+        del self._lazy_tabs[tab]
+        layout.removeWidget(placeholder)
+        placeholder.deleteLater()
+
+        # only the widgets of the new tab have to be updated
+        first_new_update = len(self.widget_updates)
+        build(layout)
+        for widget_update in self.widget_updates[first_new_update:]:
+            try:
+                widget_update()
+            except InvalidConfigValueError:
+                pass
+
     def execute_on_save(self, hook: Callable[[], None]) -> None:
         self._on_save_hook.append(hook)
 
@@ -183,6 +291,11 @@ class ConfigLayout(QBoxLayout):
         self.conf = conf_window.conf
         self.config_window = conf_window
         self.widget_updates = conf_window.widget_updates
+        self.widget_updates_by_key = conf_window.widget_updates_by_key
+
+    def _add_widget_update(self, key: str, update: Callable[[], None]) -> None:
+        self.widget_updates.append(update)
+        self.widget_updates_by_key[key].append(update)
 
     # Config Input Widgets
 
@@ -206,7 +319,7 @@ class ConfigLayout(QBoxLayout):
                 raise InvalidConfigValueError(key, "boolean", value)
             checkbox.setChecked(value)
 
-        self.widget_updates.append(update)
+        self._add_widget_update(key, update)
 
         checkbox.stateChanged.connect(  # type: ignore
             lambda s: self.conf.set(
@@ -239,7 +352,7 @@ class ConfigLayout(QBoxLayout):
                 )
             combobox.setCurrentIndex(index)
 
-        self.widget_updates.append(update)
+        self._add_widget_update(key, update)
 
         combobox.currentIndexChanged.connect(  # type: ignore
             lambda idx: self.conf.set(key, values[idx])
@@ -302,7 +415,7 @@ class ConfigLayout(QBoxLayout):
 
         load_table(items)
 
-        self.widget_updates.append(update)
+        self._add_widget_update(key, update)
 
         if description is not None:
             self.text(description, tooltip=tooltip)
@@ -326,7 +439,7 @@ class ConfigLayout(QBoxLayout):
             line_edit.setText(val)
             line_edit.setCursorPosition(0)
 
-        self.widget_updates.append(update)
+        self._add_widget_update(key, update)
 
         def on_editing_finished():
             self.conf.set(key, line_edit.text())
@@ -386,7 +499,7 @@ class ConfigLayout(QBoxLayout):
                 )
             spin_box.setValue(val)
 
-        self.widget_updates.append(update)
+        self._add_widget_update(key, update)
 
         spin_box.valueChanged.connect(lambda val: self.conf.set(key, val))  # type: ignore
 
@@ -452,7 +565,7 @@ class ConfigLayout(QBoxLayout):
             self.conf.set(key, rgb)
             set_color(rgb)
 
-        self.widget_updates.append(update)
+        self._add_widget_update(key, update)
         color_dialog.colorSelected.connect(lambda color: save(color))  # type: ignore
         button.clicked.connect(lambda _: color_dialog.exec())  # type: ignore
 
@@ -518,7 +631,7 @@ class ConfigLayout(QBoxLayout):
                 self.conf.set(key, path)
                 update()
 
-        self.widget_updates.append(update)
+        self._add_widget_update(key, update)
         button.clicked.connect(get_path)  # type: ignore
 
         return (line_edit, button)
@@ -542,7 +655,7 @@ class ConfigLayout(QBoxLayout):
             val = val.replace(" ", "")
             edit.setKeySequence(val)
 
-        self.widget_updates.append(update)
+        self._add_widget_update(key, update)
 
         edit.keySequenceChanged.connect(  # type: ignore
             lambda s: self.conf.set(key, edit.keySequence().toString())
@@ -584,7 +697,7 @@ class ConfigLayout(QBoxLayout):
                 raise InvalidConfigValueError(key, "str", val)
             combo.setCurrentText(val)
 
-        self.widget_updates.append(update)
+        self._add_widget_update(key, update)
 
         combo.currentTextChanged.connect(  # type: ignore
             lambda s: self.conf.set(key, combo.currentText())
@@ -17,8 +17,10 @@ from .lernplan_manager import open_lernplan_manager, open_lerntag_deck_creator
 from .utils import get_ankizin_versions
 
 from ..gui.projekt_anki_menu import get_ankizin_menu
-from ..gui.config_window import note_type_version
-from ..notetype_setting_definitions import projekt_anki_notetype_models
+from ..notetype_setting_definitions import (
+    projekt_anki_notetype_names,
+    projekt_anki_notetype_version,
+)
 
 ankizin_helper = None
 
@@ -153,7 +155,7 @@ def add_help_items_to_debug(debug_menu):
 
 def init_version_info(menu):
     """Add version info to a DEBUG submenu."""
-    note_version = note_type_version(projekt_anki_notetype_models()[0])
+    note_version = projekt_anki_notetype_version(projekt_anki_notetype_names()[0])
     if not note_version:
         return
 
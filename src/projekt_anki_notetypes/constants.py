@@ -4,6 +4,9 @@ import re
 NOTETYPE_COPY_RE = r"{notetype_base_name}-[a-zA-Z0-9]{{5}}"
 ANKIHUB_NOTETYPE_RE = r"{notetype_base_name} \(.+ / .+?\)"
 
+# the version of a notetype is specified on the top of the front template
+NOTETYPE_VERSION_RE = re.compile(r"<!-- version ([\w\d]+) -->\n")
+
 # has to be the same as in the ankihub addon
 ANKIHUB_NOTE_TYPE_MODIFICATION_STRING = "ANKIHUB MODFICATIONS"
 ANKIHUB_TEMPLATE_SNIPPET_RE = (
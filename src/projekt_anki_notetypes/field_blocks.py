@@ -0,0 +1,137 @@
+import re
+from typing import Dict, List, Optional, Tuple
+
+# {{#Field}}, {{^Field}} and {{/Field}} tags and the PSEUDO-FIELD spans used instead
+# of them in some templates, e.g. <span ...>PSEUDO-FIELD #Field</span>
+# (the names can't contain braces or "<", so every tag is found in linear time)
+_TAG_RE = re.compile(r"\{\{([#^/])([^{}\n]+)\}\}|PSEUDO-FIELD ([#^/])([^<\n]+)</span>")
+
+# the fields can be disabled by wrapping them into "<!--" and "-->" (see
+# disable_field_setting_config), the wrappers belong to the block
+_COMMENT_START = ("<!-- ", "<!--")
+_COMMENT_END = (" -->", "-->")
+
+
+class FieldBlock:
+    """A {{#Field}}...{{/Field}} or {{^Field}}...{{/Field}} section of a template,
+    including the "<!--" and "-->" around it if the field is disabled.
+
+    Has the span and group methods of re.Match, so it can be used in place of a match of
+    CONDITIONAL_FIELD_RE."""
+
+    __slots__ = ("text", "name", "inverted", "start", "end", "children")
+
+    def __init__(self, text: str, name: str, inverted: bool, start: int):
+        self.text = text
+        self.name = name
+        self.inverted = inverted
+        self.start = start
+        self.end = -1
+        self.children: List["FieldBlock"] = []
+
+    def span(self) -> Tuple[int, int]:
+        return self.start, self.end
+
+    def group(self, index: int = 0) -> str:
+        assert index == 0, "field blocks have no groups"
+        return self.text[self.start : self.end]
+
+    def __repr__(self) -> str:
+        kind = "^" if self.inverted else "#"
+        return f"FieldBlock({kind}{self.name}, {self.start}, {self.end})"
+
+
+class FieldBlockTree:
+    """The conditional field blocks of a template, parsed with one pass over its tags.
+
+    Blocks are closed by the next {{/Field}} with the same name, blocks that are never
+    closed are dropped (their children are kept)."""
+
+    def __init__(self, text: str):
+        self.text = text
+        self.roots: List[FieldBlock] = []
+        # name -> first {{#name}} block
+        self._first_blocks: Dict[str, FieldBlock] = dict()
+        self._parse()
+
+    def find(self, name: str) -> Optional[FieldBlock]:
+        # returns the first (not inverted) block of the field
+        return self._first_blocks.get(name)
+
+    def conditional_fields(self) -> List[FieldBlock]:
+        # returns the outermost {{#Field}} blocks in the order they appear in the
+        # template, inverted blocks are looked into
+        result = []
+        stack = list(reversed(self.roots))
+        while stack:
+            block = stack.pop()
+            if block.inverted:
+                stack.extend(reversed(block.children))
+            else:
+                result.append(block)
+        return result
+
+    def _parse(self) -> None:
+        text = self.text
+        # open blocks, each with the list its block is added to when it is closed
+        stack: List[Tuple[FieldBlock, List[FieldBlock]]] = []
+        children = self.roots
+        last_tag_end = 0
+        for m in _TAG_RE.finditer(text):
+            if m.group(1):
+                kind, name = m.group(1), m.group(2)
+                tag_start, tag_end = m.span()
+            else:
+                kind, name = m.group(3), m.group(4)
+                tag_start = _pseudo_field_start(text, m.start(), last_tag_end)
+                tag_end = m.end()
+                if tag_start == -1:
+                    continue
+            last_tag_end = tag_end
+
+            if kind != "/":
+                block = FieldBlock(
+                    text, name, inverted=kind == "^", start=tag_start
+                )
+                for prefix in _COMMENT_START:
+                    if text.startswith(prefix, tag_start - len(prefix)):
+                        block.start -= len(prefix)
+                        break
+                stack.append((block, children))
+                children = block.children
+                continue
+
+            idx = next(
+                (i for i in range(len(stack) - 1, -1, -1) if stack[i][0].name == name),
+                None,
+            )
+            if idx is None:
+                continue
+
+            # blocks opened after the closed one are never closed
+            for unclosed, parent_children in reversed(stack[idx + 1 :]):
+                parent_children.extend(unclosed.children)
+            block, children = stack[idx]
+            del stack[idx:]
+
+            block.end = tag_end
+            for suffix in _COMMENT_END:
+                if text.startswith(suffix, tag_end):
+                    block.end += len(suffix)
+                    break
+            children.append(block)
+            if not block.inverted and (
+                name not in self._first_blocks
+                or block.start < self._first_blocks[name].start
+            ):
+                self._first_blocks[name] = block
+
+        for unclosed, parent_children in reversed(stack):
+            parent_children.extend(unclosed.children)
+
+
+def _pseudo_field_start(text: str, pos: int, min_pos: int) -> int:
+    # the span of a PSEUDO-FIELD starts at the first "<span" on the same line
+    # that is after the previous tag
+    line_start = text.rfind("\n", 0, pos) + 1
+    return text.find("<span", max(line_start, min_pos), pos)
@@ -1,44 +1,129 @@
+import json
 import re
-from collections import defaultdict
+import threading
+import time
+from collections import OrderedDict, defaultdict
 from concurrent.futures import Future
-from typing import Any, Dict, List, Optional, Union
+from functools import partial
+from typing import Any, Dict, List, NamedTuple, Optional, Set, Tuple, Union
 
+from anki.collection import OpChanges
 from aqt import mw
 from aqt.clayout import CardLayout
-from aqt.qt import QHBoxLayout, QLabel, QWidget
+from aqt.operations import CollectionOp
+from aqt.qt import QHBoxLayout, QLabel, QTimer, QWidget
 from aqt.utils import askUser, showInfo, tooltip
 
 from ..ankiaddonconfig import ConfigManager, ConfigWindow
+from ..ankiaddonconfig.manager import ConfigSnapshot
 from ..ankiaddonconfig.window import ConfigLayout
-from ..constants import ANKIHUB_NOTETYPE_RE, NOTETYPE_COPY_RE
-from ..notetype_setting import NotetypeSetting, NotetypeSettingException
+from ..constants import NOTETYPE_VERSION_RE
+from ..notetype_setting import (
+    NotetypeSetting,
+    NotetypeSettingException,
+    apply_settings,
+    values_from_conf,
+)
 from ..notetype_setting_definitions import (
     projekt_anki_notetype_model,
     projekt_anki_notetype_names,
+    projekt_anki_notetype_version,
     configurable_fields_for_notetype,
     general_settings,
     general_settings_defaults_dict,
     setting_configs,
 )
-from ..utils import update_notetype_to_newest_version
+from ..notetype_versions import notetype_version_index
+from ..settings_cache import save_settings_cache
+from ..utils import notetype_fingerprint, update_notetype_to_newest_version
 from .projekt_anki_widgets import ProjektAnkiIconsLayout, GithubLinkLayout
 from .extra_notetype_versions import handle_extra_notetype_versions
 
 try:
+    from anki.collection import Collection  # pylint: disable=unused-import
     from anki.models import NotetypeDict  # pylint: disable=unused-import
 except:
     pass
 
 
+# (model id, mod, hash of the template texts) -> names of the settings present on the model
+# the hash is part of the key, because models are changed without their mod changing
+# (in the card layout window and by the add-on before they are saved)
+_present_setting_names: "OrderedDict[Tuple, List[str]]" = OrderedDict()
+_MAX_MODEL_REVISIONS = 64
+# the settings are read in in a background thread
+_present_setting_names_lock = threading.Lock()
+
+# changes of settings made in this time are shown together in the card layout window
+CLAYOUT_UPDATE_DELAY_MS = 150
+
+# replaces the css of the card in the preview of the card layout window, the html of the
+# card starts with a style element with the css of the notetype
+# (evaluates to false if it is not there)
+_REPLACE_PREVIEW_CSS_JS = """
+(function (css) {{
+    const style = document.querySelector("#qa > style");
+    if (!style) {{
+        return false;
+    }}
+    style.textContent = css;
+    return true;
+}})({css});
+"""
+
+
 def ntss_for_model(model: "NotetypeDict") -> List[NotetypeSetting]:
     # returns all nts that are present on the notetype
-    result = []
-    for setting_config in setting_configs.values():
-        nts = NotetypeSetting.from_config(setting_config)
-        if nts.is_present(model):
-            result.append(nts)
+    # which settings are present is only checked once per revision of the model
+    key = _model_revision_key(model)
+    with _present_setting_names_lock:
+        setting_names = _present_setting_names.get(key)
+        if setting_names is not None:
+            _present_setting_names.move_to_end(key)
+
+    if setting_names is None:
+        setting_names = [
+            setting_name
+            for setting_name, setting_config in setting_configs.items()
+            if NotetypeSetting.from_config(setting_config).is_present(model)
+        ]
+        with _present_setting_names_lock:
+            _present_setting_names[key] = setting_names
+            if len(_present_setting_names) > _MAX_MODEL_REVISIONS:
+                _present_setting_names.popitem(last=False)
+
+    return [
+        NotetypeSetting.from_config(setting_configs[setting_name])
+        for setting_name in setting_names
+    ]
 
-    return result
+
+def _model_revision_key(model: "NotetypeDict") -> Tuple:
+    texts = [model["css"]]
+    for template in model["tmpls"]:
+        texts.append(template["qfmt"])
+        texts.append(template["afmt"])
+    # python caches the hashes of strings, so this is cheap for texts that were hashed before
+    return (model.get("id"), model.get("mod"), hash(tuple(texts)))
+
+
+def _forget_model_revisions(model: "NotetypeDict") -> None:
+    # called when the add-on wrote the model to the collection
+    with _present_setting_names_lock:
+        for key in [
+            key for key in _present_setting_names if key[0] == model.get("id")
+        ]:
+            del _present_setting_names[key]
+
+
+def _update_model_if_changed(model: "NotetypeDict", fingerprint: str) -> bool:
+    # writes the model to the collection if it changed since the fingerprint was taken,
+    # returns whether it was written
+    if notetype_fingerprint(model) == fingerprint:
+        return False
+    mw.col.models.update_dict(model)  # type: ignore
+    _forget_model_revisions(model)
+    return True
 
 
 def general_ntss() -> List[NotetypeSetting]:
@@ -50,6 +135,13 @@ def general_ntss() -> List[NotetypeSetting]:
     return result
 
 
+class _NotetypeUpdateResult(NamedTuple):
+    # the changes property is used by CollectionOp
+    changes: OpChanges
+    updated_models: List["NotetypeDict"]
+    cancelled: bool
+
+
 class NotetypesConfigWindow:
     window: Optional[ConfigWindow] = None
 
@@ -61,10 +153,25 @@ class NotetypesConfigWindow:
             if clayout_.model["name"] in _names_of_all_supported_note_types():
                 self.clayout = clayout_
 
-        self.conf = None
+        self.conf: Optional[ConfigManager] = None
         self.last_general_ntss: Union[List[NotetypeSetting], None] = None
+        # notetype base name -> config when the notetype was read in or last written,
+        # used to only rewrite notetypes with changed settings
+        self.read_in_values: Dict[str, ConfigSnapshot] = dict()
+        # the settings are read in in the background when the window is opened, the tabs
+        # show a placeholder until the settings they need were read in
+        self.read_in_notetype_names: Set[str] = set()
+        self.general_settings_read_in = False
+        self._read_in_cancelled = threading.Event()
+        # names of the changed settings that are not shown in the card layout window yet
+        # (dict as an ordered set)
+        self._pending_clayout_setting_names: Dict[str, None] = dict()
+        self._clayout_update_timer: Optional[QTimer] = None
 
     def open(self):
+        # notetypes can be changed by other add-ons without an operation that
+        # invalidates the index
+        notetype_version_index.invalidate()
         handle_extra_notetype_versions()
 
         # dont open another window if one is already open
@@ -87,9 +194,8 @@ class NotetypesConfigWindow:
         # addon config
         # the config is populated at the start with the current setting values parsed
         # from the notetype and then used to update the settings
-        self.conf = ConfigManager()
-
-        self._read_in_settings()
+        # flat: the settings are looked up by their full keys thousands of times
+        self.conf = ConfigManager(flat=True)
 
         # add general tab
         self.conf.add_config_tab(lambda window: self._add_general_tab(window))
@@ -115,28 +221,19 @@ class NotetypesConfigWindow:
             )
 
         # setup live update of clayout model on changes
-        def live_update_clayout_model(key: str, _: Any):
-            notetype_base_name_from_setting, setting_name = key.split(".")
-            model = self.clayout.model
-            notetype_base_name_from_model = _notetype_base_name(model["name"])
-            if notetype_base_name_from_setting != notetype_base_name_from_model:
-                return
-
-            nts = NotetypeSetting.from_config(setting_configs[setting_name])
-            self._safe_update_model_settings(
-                model=model,
-                notetype_base_name=notetype_base_name_from_model,
-                ntss=[nts],
-            )
-
-            self._update_clayout_model(model)
-
         if self.clayout:
-            self.conf.on_change(live_update_clayout_model)
+            self.conf.on_change(
+                self._queue_clayout_model_update,
+                prefix=_notetype_base_name(self.clayout.model["name"]),
+            )
 
         # change window settings, overwrite on_save, setup notetype updates
         self.conf.on_window_open(self._setup_window_settings)
 
+        # started before the window is opened, because open_config blocks until the
+        # window is closed, the results are handled while the window is open
+        self._read_in_settings_in_background()
+
         # open the config window
         if self.clayout:
             self.conf.open_config(self.clayout)
@@ -157,6 +254,19 @@ class NotetypesConfigWindow:
         window.save_btn.clicked.disconnect()  # type: ignore
         window.save_btn.clicked.connect(lambda: on_save(window))  # type: ignore
 
+        # results that arrive after the window was closed are not used
+        window.execute_on_close(lambda: self._read_in_cancelled.set())
+
+        if self.clayout:
+            self._clayout_update_timer = QTimer(window)
+            self._clayout_update_timer.setSingleShot(True)
+            self._clayout_update_timer.setInterval(CLAYOUT_UPDATE_DELAY_MS)
+            self._clayout_update_timer.timeout.connect(  # type: ignore
+                self._apply_pending_clayout_model_updates
+            )
+            # changes made right before the window is closed are shown too
+            window.execute_on_close(self._apply_pending_clayout_model_updates)
+
         if self.clayout:
             self._set_active_tab(
                 _notetype_base_name(self.clayout.model["name"])
@@ -197,6 +307,17 @@ class NotetypesConfigWindow:
         window: ConfigWindow,
         index: Optional[int] = None,
     ):
+        # the widgets are only created when the tab is shown for the first time
+        window.add_lazy_tab(
+            notetype_base_name,
+            lambda tab: self._build_notetype_settings_tab(tab, notetype_base_name),
+            index=index,
+            is_ready=lambda: notetype_base_name in self.read_in_notetype_names,
+        )
+
+    def _build_notetype_settings_tab(
+        self, tab: ConfigLayout, notetype_base_name: str
+    ) -> None:
         if (
             self.clayout
             and _notetype_base_name(self.clayout.model["name"])
@@ -206,8 +327,6 @@ class NotetypesConfigWindow:
         else:
             model = _most_basic_notetype_version(notetype_base_name)
 
-        tab = window.add_tab(notetype_base_name, index=index)
-
         if model:
             ntss = ntss_for_model(model)
             ordered_ntss = self._adjust_configurable_field_nts_order(
@@ -235,8 +354,14 @@ class NotetypesConfigWindow:
             )
 
     def _add_general_tab(self, window: ConfigWindow):
-        tab = window.add_tab("Allgemein", index=0)
+        window.add_lazy_tab(
+            "Allgemein",
+            self._build_general_tab,
+            index=0,
+            is_ready=lambda: self.general_settings_read_in,
+        )
 
+    def _build_general_tab(self, tab: ConfigLayout) -> None:
         prev_ntss = self.last_general_ntss
         self.last_general_ntss = ntss = general_ntss()
 
@@ -360,10 +485,10 @@ class NotetypesConfigWindow:
         tab_widget = self.window.main_tab
         tab_widget.setCurrentIndex(self._get_tab_idx_by_name(tab_name))
 
-    def _reload_tab(self, tab_name: str) -> None:
-        tab_widget = self.window.main_tab
+    def _reload_tab(self, tab_name: str, read_in_settings: bool = True) -> None:
+        # read_in_settings can be False if the settings were just read in
         index = self._get_tab_idx_by_name(tab_name)
-        tab_widget.removeTab(index)
+        self.window.remove_tab(index)
 
         if tab_name == "Allgemein":
             self._add_general_tab(self.window)
@@ -372,9 +497,10 @@ class NotetypesConfigWindow:
                 notetype_base_name=tab_name, window=self.window, index=index
             )
 
-            self._read_in_settings()
+            if read_in_settings:
+                self._read_in_settings()
 
-        self.window.update_widgets()
+        # the widgets of the new tab are updated when it is built
         self._set_active_tab(tab_name)
 
     def _get_tab_idx_by_name(self, tab_name: str) -> int:
@@ -401,9 +527,13 @@ class NotetypesConfigWindow:
             return
 
         notetype_base_name = _notetype_base_name(model["name"])
+        skipped_count = 0
         for model_version in _note_type_versions(notetype_base_name):
+            fingerprint = notetype_fingerprint(model_version)
             update_notetype_to_newest_version(model_version, notetype_base_name)
-            mw.col.models.update_dict(model_version)  # type: ignore
+            if not _update_model_if_changed(model_version, fingerprint):
+                skipped_count += 1
+        print(f"reset {notetype_base_name}, {skipped_count} notetypes were unchanged")
 
         if self.clayout:
             self._update_clayout_model(model)
@@ -421,20 +551,23 @@ class NotetypesConfigWindow:
         ):
             return
 
-        for notetype_base_name in projekt_anki_notetype_names():
-            model = _most_basic_notetype_version(notetype_base_name)
-            if not model:
-                continue
+        # the change hooks are called once per changed setting at the end
+        with self.conf.batch():
+            for notetype_base_name in projekt_anki_notetype_names():
+                model = _most_basic_notetype_version(notetype_base_name)
+                if not model:
+                    continue
 
-            settings_defaults = general_settings_defaults_dict()
-            for nts in general_ntss():
-                value = settings_defaults[nts.name()]
-                self.conf[nts.key(notetype_base_name)] = value
-                self.conf.set(
-                    f"general.{nts.name()}", value, on_change_trigger=False
-                )
+                settings_defaults = general_settings_defaults_dict()
+                for nts in general_ntss():
+                    value = settings_defaults[nts.name()]
+                    self.conf[nts.key(notetype_base_name)] = value
+                    self.conf.set(
+                        f"general.{nts.name()}", value, on_change_trigger=False
+                    )
 
         self._apply_setting_changes_for_all_notetypes()
+        self.window.update_widgets()
         self._reload_tab("Allgemein")
 
         tooltip(
@@ -452,10 +585,36 @@ class NotetypesConfigWindow:
         ):
             return
 
-        def task():
+        # the updates are done in one collection operation, so they can be undone
+        # together, the user can cancel the operation between two models
+        cancelled = threading.Event()
+
+        def show_progress(index: int, count: int, model_name: str) -> None:
+            # runs on the main thread
+            if mw.progress.want_cancel():
+                cancelled.set()
+            mw.progress.update(
+                label=f"Aktualisiere Notiztypen... ({index + 1}/{count})\n{model_name}",
+                value=index,
+                max=count,
+            )
+
+        def op(col: "Collection") -> _NotetypeUpdateResult:
             to_be_updated = models_with_available_updates()
-            for model in to_be_updated:
+            updated_models: List["NotetypeDict"] = []
+            changes = OpChanges()
+            undo_entry: Optional[int] = None
+            skipped_count = 0
+            for index, model in enumerate(to_be_updated):
+                if cancelled.is_set():
+                    break
+                mw.taskman.run_on_main(
+                    partial(show_progress, index, len(to_be_updated), model["name"])
+                )
+                start = time.perf_counter()
+
                 # update the model to the newest version
+                fingerprint = notetype_fingerprint(model)
                 base_name = _notetype_base_name(model["name"])
                 update_notetype_to_newest_version(model, base_name)
 
@@ -468,41 +627,62 @@ class NotetypesConfigWindow:
                 )
 
                 # update the model in the database
-                mw.col.models.update_dict(model)
-
-            return to_be_updated
+                if notetype_fingerprint(model) == fingerprint:
+                    skipped_count += 1
+                else:
+                    if undo_entry is None:
+                        undo_entry = col.add_custom_undo_entry(
+                            "Ankizin-Notiztypen aktualisieren"
+                        )
+                    col.models.update_dict(model)
+                    _forget_model_revisions(model)
+                    changes = col.merge_undo_entries(undo_entry)
+                    updated_models.append(model)
+                print(
+                    f"updated {model['name']} in "
+                    f"{(time.perf_counter() - start) * 1000:.0f} ms"
+                )
 
-        def on_done(updated_models_fut: Future):
-            updated_models = updated_models_fut.result()
+            print(
+                f"updated {len(updated_models)} of {len(to_be_updated)} notetypes, "
+                f"{skipped_count} were unchanged"
+                + (", cancelled" if cancelled.is_set() else "")
+            )
+            return _NotetypeUpdateResult(
+                changes=changes,
+                updated_models=updated_models,
+                cancelled=cancelled.is_set(),
+            )
 
-            for model in updated_models:
+        def on_success(result: _NotetypeUpdateResult) -> None:
+            for model in result.updated_models:
                 if self.clayout and model["name"] == self.clayout.model["name"]:
                     self._update_clayout_model(model)
 
+            # only the tabs of the updated notetypes are reloaded, the settings are
+            # read in once for all of them
+            updated_base_names = sorted(
+                {_notetype_base_name(model["name"]) for model in result.updated_models}
+            )
+            if updated_base_names:
+                self._read_in_settings()
             self._reload_tab("Allgemein")
-            updated_base_models = [
-                m
-                for m in updated_models
-                if m["name"] == _notetype_base_name(m["name"])
-            ]
-            for model in sorted(updated_base_models, key=lambda m: m["name"]):
-                self._reload_tab(_notetype_base_name(model["name"]))
+            for notetype_base_name in updated_base_names:
+                self._reload_tab(notetype_base_name, read_in_settings=False)
 
             self._set_active_tab("Allgemein")
 
             tooltip(
-                "Notiztypen wurden aktualisiert",
+                "Aktualisierung abgebrochen"
+                if result.cancelled
+                else "Notiztypen wurden aktualisiert",
                 parent=self.window,
                 period=1200,
             )
 
-        mw.taskman.with_progress(
-            parent=self.window,
-            label="Aktualisiere Notiztypen...",
-            task=task,
-            on_done=on_done,
-            immediate=True,
-        )
+        CollectionOp(parent=self.window, op=op).success(
+            on_success
+        ).run_in_background()
 
     def _import_notetype_and_reload_tab(self, notetype_base_name: str) -> None:
         self._import_notetype(notetype_base_name)
@@ -512,6 +692,7 @@ class NotetypesConfigWindow:
         model = projekt_anki_notetype_model(notetype_base_name)
         model["id"] = 0
         mw.col.models.add_dict(model)  # type: ignore
+        notetype_version_index.invalidate()
 
     # read / write notetype settings
     # changes to settings will be written to mw.col.models when the Save button is pressed
@@ -519,45 +700,115 @@ class NotetypesConfigWindow:
     # this is done by _apply_setting_changes_for_all_notetypes
     def _read_in_settings(self):
         # read in settings from notetypes and general ones into config
-        self._read_in_settings_from_notetypes()
-        self._read_in_general_settings()
+        # a read-in that is still running in the background is replaced by this one
+        self._read_in_cancelled.set()
+        self._read_in_cancelled = threading.Event()
 
-    def _read_in_settings_from_notetypes(self):
+        values_before = self.conf.snapshot()
         error_msg = ""
         for notetype_base_name in projekt_anki_notetype_names():
-            if self.clayout and notetype_base_name == _notetype_base_name(
-                self.clayout.model["name"]
-            ):
-                # if in live preview mode read in current not confirmed settings
-                model = self.clayout.model
-            else:
-                model = _most_basic_notetype_version(notetype_base_name)
+            values, notetype_error_msg = self._notetype_setting_values(
+                notetype_base_name
+            )
+            self._set_read_in_notetype_settings(notetype_base_name, values)
+            error_msg += notetype_error_msg
+        self._set_read_in_general_settings(self._general_setting_values())
+        # the settings found while reading in are reused after a restart of Anki
+        save_settings_cache()
 
-            if not model:
-                continue
-            for nts in ntss_for_model(model):
-                try:
-                    self.conf[nts.key(notetype_base_name)] = nts.setting_value(
-                        model
-                    )
-                except NotetypeSettingException as e:
-                    error_msg += (
-                        f"failed parsing {notetype_base_name}:\n{str(e)}\n\n"
-                    )
+        # only the widgets of the settings that have other values now
+        self.window.update_widgets(self.conf.changed_keys(values_before))
 
         if error_msg:
             showInfo(error_msg)
 
-    def _read_in_general_settings(self):
-        # read in default values
-        for setting_name, value in general_settings_defaults_dict().items():
-            self.conf.set(
-                f"general.{setting_name}", value, on_change_trigger=False
-            )
+    def _read_in_settings_in_background(self) -> None:
+        # the settings of the notetypes are parsed in a background thread and put into
+        # the config one notetype after the other, the tabs are built when the settings
+        # of their notetype are there
+        cancelled = self._read_in_cancelled = threading.Event()
+
+        def on_notetype_read_in(notetype_base_name: str, values: Dict[str, Any]):
+            if cancelled.is_set():
+                return
+            self._set_read_in_notetype_settings(notetype_base_name, values)
+            self.window.build_current_tab()
+
+        def task() -> Tuple[str, Dict[str, Any]]:
+            error_msg = ""
+            for notetype_base_name in projekt_anki_notetype_names():
+                if cancelled.is_set():
+                    return error_msg, dict()
+                values, notetype_error_msg = self._notetype_setting_values(
+                    notetype_base_name
+                )
+                error_msg += notetype_error_msg
+                mw.taskman.run_on_main(
+                    partial(on_notetype_read_in, notetype_base_name, values)
+                )
+            if cancelled.is_set():
+                return error_msg, dict()
+            return error_msg, self._general_setting_values()
+
+        def on_done(future: Future) -> None:
+            error_msg, general_values = future.result()
+            if cancelled.is_set():
+                return
+            self._set_read_in_general_settings(general_values)
+            save_settings_cache()
+            self.window.build_current_tab()
+
+            if error_msg:
+                showInfo(error_msg, parent=self.window)
+
+        mw.taskman.run_in_background(task, on_done)
+
+    def _notetype_setting_values(
+        self, notetype_base_name: str
+    ) -> Tuple[Dict[str, Any], str]:
+        # returns the values of the settings of the notetype by config key and the
+        # error messages of the settings that couldn't be parsed
+        # (called in a background thread)
+        if self.clayout and notetype_base_name == _notetype_base_name(
+            self.clayout.model["name"]
+        ):
+            # if in live preview mode read in current not confirmed settings
+            model = self.clayout.model
+        else:
+            model = _most_basic_notetype_version(notetype_base_name)
+
+        values: Dict[str, Any] = dict()
+        error_msg = ""
+        if not model:
+            return values, error_msg
+        for nts in ntss_for_model(model):
+            try:
+                values[nts.key(notetype_base_name)] = nts.setting_value(model)
+            except NotetypeSettingException as e:
+                error_msg += f"failed parsing {notetype_base_name}:\n{str(e)}\n\n"
+        return values, error_msg
+
+    def _set_read_in_notetype_settings(
+        self, notetype_base_name: str, values: Dict[str, Any]
+    ) -> None:
+        for key, value in values.items():
+            self.conf.set(key, value, on_change_trigger=False)
+        self.read_in_notetype_names.add(notetype_base_name)
+        self._remember_read_in_values([notetype_base_name])
+
+    def _general_setting_values(self) -> Dict[str, Any]:
+        # returns the values of the general settings by config key
+        # (called in a background thread)
+
+        # default values
+        result = {
+            f"general.{setting_name}": value
+            for setting_name, value in general_settings_defaults_dict().items()
+        }
 
         # if all notetypes that have a nts have the same value set the value to it
-        models_by_nts: Dict[NotetypeSetting, "NotetypeDict"] = defaultdict(
-            lambda: []
+        models_by_nts: Dict[NotetypeSetting, List["NotetypeDict"]] = defaultdict(
+            list
         )
         for notetype_base_name in projekt_anki_notetype_names():
             model = _most_basic_notetype_version(notetype_base_name)
@@ -575,13 +826,37 @@ class NotetypesConfigWindow:
                     setting_value == nts.setting_value(model)
                     for model in models
                 ):
-                    self.conf.set(
-                        f"general.{nts.name()}",
-                        setting_value,
-                        on_change_trigger=False,
-                    )
+                    result[f"general.{nts.name()}"] = setting_value
             except NotetypeSettingException:
                 pass
+        return result
+
+    def _set_read_in_general_settings(self, values: Dict[str, Any]) -> None:
+        for key, value in values.items():
+            self.conf.set(key, value, on_change_trigger=False)
+        self.general_settings_read_in = True
+
+    def _remember_read_in_values(
+        self, notetype_base_names: Optional[List[str]] = None
+    ) -> None:
+        if notetype_base_names is None:
+            notetype_base_names = projekt_anki_notetype_names()
+        # the snapshot shares the values with the config until the config is changed
+        snapshot = self.conf.snapshot()
+        for notetype_base_name in notetype_base_names:
+            self.read_in_values[notetype_base_name] = snapshot
+
+    def _changed_setting_names(self, notetype_base_name: str) -> Set[str]:
+        # names of the settings of the notetype that were changed in the config since
+        # the notetypes were read in or last written
+        snapshot = self.read_in_values.get(notetype_base_name)
+        if snapshot is None:
+            return set(self.conf.get(notetype_base_name, dict()).keys())
+        prefix = f"{notetype_base_name}."
+        return {
+            key[len(prefix) :]
+            for key in self.conf.changed_keys(snapshot, prefix=prefix)
+        }
 
     def _safe_update_model_settings(
         self,
@@ -596,20 +871,12 @@ class NotetypesConfigWindow:
         notetype_base_name: The base name of the note type. This is used to get the correct setting values from self.conf
         ntss: The settings to update
         """
-        parse_exception = None
-        for nts in ntss:
-            try:
-                model.update(
-                    nts.updated_model(
-                        model=model,
-                        notetype_base_name=notetype_base_name,
-                        conf=self.conf,
-                    )
-                )
-            except NotetypeSettingException as e:
-                parse_exception = e
+        exceptions = apply_settings(
+            model, values_from_conf(ntss, notetype_base_name, self.conf)
+        )
 
-        if parse_exception:
+        if exceptions:
+            parse_exception = exceptions[-1]
             message = f"failed parsing {model['name']}:\n{str(parse_exception)}"
             if show_tooltip_on_exception:
                 tooltip(message)
@@ -619,37 +886,136 @@ class NotetypesConfigWindow:
         return True
 
     def _apply_setting_changes_for_all_notetypes(self):
+        # only the changed settings are applied and only the notetypes that have
+        # one of them are written to the collection
+        updated_models_count = 0
+        skipped_count = 0
         for notetype_base_name in projekt_anki_notetype_names():
+            changed_setting_names = self._changed_setting_names(notetype_base_name)
+            if not changed_setting_names:
+                continue
+
             for model in _note_type_versions(notetype_base_name):
                 if not model:
                     continue
-                ntss = ntss_for_model(model)
+                ntss = [
+                    nts
+                    for nts in ntss_for_model(model)
+                    if nts.name() in changed_setting_names
+                ]
+                if not ntss:
+                    continue
+                fingerprint = notetype_fingerprint(model)
                 self._safe_update_model_settings(
                     model=model,
                     notetype_base_name=notetype_base_name,
                     ntss=ntss,
                 )
-                mw.col.models.update_dict(model)
+                # e.g. when a setting was changed and changed back
+                if _update_model_if_changed(model, fingerprint):
+                    updated_models_count += 1
+                else:
+                    skipped_count += 1
+
+        self._remember_read_in_values()
+        print(
+            f"updated {updated_models_count} notetypes with changed settings, "
+            f"{skipped_count} were unchanged"
+        )
 
     # clayout
-    def _update_clayout_model(self, model):
+    def _queue_clayout_model_update(self, key: str, _: Any) -> None:
+        # the changes are collected and shown together when the timer fires, so that e.g.
+        # typing into a text field doesn't redraw the card layout window on every key
+        # only called for the settings of the notetype of the model (see open)
+        setting_name = key.split(".")[1]
+        self._pending_clayout_setting_names[setting_name] = None
+        if self._clayout_update_timer is None:
+            self._apply_pending_clayout_model_updates()
+        elif not self._clayout_update_timer.isActive():
+            # the timer is not restarted by further changes, so that the preview is
+            # updated regularly while e.g. a spin box is changed continuously
+            self._clayout_update_timer.start()
+
+    def _apply_pending_clayout_model_updates(self) -> None:
+        if self._clayout_update_timer is not None:
+            self._clayout_update_timer.stop()
+        if not self._pending_clayout_setting_names:
+            return
+
+        # the card layout window renders the preview with a timer of its own that
+        # replaces a render which didn't start yet, so redraws don't pile up
+        model = self.clayout.model
+        ntss = [
+            NotetypeSetting.from_config(setting_configs[setting_name])
+            for setting_name in self._pending_clayout_setting_names
+        ]
+        self._pending_clayout_setting_names = dict()
+
+        self._safe_update_model_settings(
+            model=model,
+            notetype_base_name=_notetype_base_name(model["name"]),
+            ntss=ntss,
+        )
+        self._update_clayout_model(
+            model, changed_files={nts.config["file"] for nts in ntss}
+        )
+
+    def _update_clayout_model(
+        self, model, changed_files: Optional[Set[str]] = None
+    ):
         # update templates
         # keep scrollbar in note type manager window where it was
         # add basic mark to the change tracker
+        # changed_files are the "file"s of the changed settings, if they are passed
+        # the preview is only rendered again if that is needed to show the changes
         scroll_bar = self.clayout.tform.edit_area.verticalScrollBar()
         scroll_pos = scroll_bar.value()
         self.clayout.model = model
         self.clayout.templates = model["tmpls"]
         self.clayout.change_tracker.mark_basic()
-        self.clayout.update_current_ordinal_and_redraw(self.clayout.ord)
+        if changed_files is not None and self._update_clayout_preview_partially(
+            model, changed_files
+        ):
+            # only the text in the editor has to be updated
+            self.clayout.fill_fields_from_template()
+        else:
+            self.clayout.update_current_ordinal_and_redraw(self.clayout.ord)
         scroll_bar.setValue(min(scroll_pos, scroll_bar.maximum()))
 
+    def _update_clayout_preview_partially(
+        self, model: "NotetypeDict", changed_files: Set[str]
+    ) -> bool:
+        # returns False if the preview has to be rendered again
+        if self.clayout.preview_web is None:
+            # the preview is not set up yet or was already torn down, e.g. when the
+            # timer fires while the card layout window is closed
+            return True
+
+        if changed_files == {"style"}:
+            # the new css is put into the shown card, so that its html isn't rendered
+            # again and the scripts of the template don't run again
+            def on_done(replaced: bool) -> None:
+                if not replaced and self.clayout.preview_web is not None:
+                    self.clayout.renderPreview()
+
+            self.clayout.preview_web.evalWithCallback(
+                _REPLACE_PREVIEW_CSS_JS.format(css=json.dumps(model["css"])), on_done
+            )
+            return True
+
+        if changed_files == {"back"} and self.clayout.pform.preview_front.isChecked():
+            # the preview shows the front side, which didn't change
+            return True
+
+        return False
+
 
 def note_type_version(model: "NotetypeDict") -> Optional[str]:
     """Returns the version of the model or None if it is not specified.
     The version is specified on the top of the front template of the model."""
     front = model["tmpls"][0]["qfmt"]
-    m = re.match(r"<!-- version ([\w\d]+) -->\n", front)
+    m = NOTETYPE_VERSION_RE.match(front)
     if not m:
         return None
     return m.group(1)
@@ -667,7 +1033,7 @@ def models_with_available_updates() -> List["NotetypeDict"]:
 def _new_version_available_for_model(model: "NotetypeDict") -> bool:
     current_version = note_type_version(model)
     base_name = _notetype_base_name(model["name"])
-    newest_version = note_type_version(projekt_anki_notetype_model(base_name))
+    newest_version = projekt_anki_notetype_version(base_name)
     return current_version != newest_version
 
 
@@ -675,20 +1041,7 @@ def _note_type_versions(notetype_base_name: str) -> List["NotetypeDict"]:
     """Returns a list of all notetype versions of the notetype in the collection.
     Version of a note type are created by the AnkiHub add-on and by copying
     the base AnKing note types or importing them from different sources."""
-    models = [
-        mw.col.models.get(x.id)  # type: ignore
-        for x in mw.col.models.all_names_and_ids()
-        if x.name == notetype_base_name
-        or re.match(
-            ANKIHUB_NOTETYPE_RE.format(notetype_base_name=notetype_base_name),
-            x.name,
-        )
-        or re.match(
-            NOTETYPE_COPY_RE.format(notetype_base_name=notetype_base_name),
-            x.name,
-        )
-    ]
-    return models
+    return notetype_version_index.models(notetype_base_name)
 
 
 def _most_basic_notetype_version(
@@ -708,6 +1061,11 @@ def _most_basic_notetype_version(
 def _notetype_base_name(model_name: str) -> str:
     """Returns the base name of a note type, that is if it's a version of a an anking note type
     it will return the base name, otherwise it will return the name itself."""
+    result = notetype_version_index.base_name(model_name)
+    if result is not None:
+        return result
+
+    # the notetype is not in the collection
     return next(
         (
             notetype_base_name
@@ -721,8 +1079,4 @@ def _notetype_base_name(model_name: str) -> str:
 def _names_of_all_supported_note_types() -> List[str]:
     """Returns a list of names of note types supported by the add-on that are in the collection,
     including all versions of the base note types."""
-    return [
-        version["name"]
-        for notetype_base_name in projekt_anki_notetype_names()
-        for version in _note_type_versions(notetype_base_name)
-    ]
+    return notetype_version_index.names()
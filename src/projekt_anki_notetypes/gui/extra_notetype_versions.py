@@ -1,4 +1,3 @@
-import re
 from concurrent.futures import Future
 from copy import deepcopy
 from typing import Dict, List
@@ -6,25 +5,21 @@ from typing import Dict, List
 from aqt import mw
 from aqt.utils import askUser, tooltip
 
-from ..constants import NOTETYPE_COPY_RE
 from ..notetype_setting_definitions import projekt_anki_notetype_names
-from ..utils import adjust_fields, create_backup
+from ..notetype_versions import BASE_VERSION, COPY_VERSION, notetype_version_index
+from ..utils import adjust_fields, create_backup, notetype_fingerprint
 
 
 def handle_extra_notetype_versions() -> None:
     # mids of copies of the AnKing notetype identified by its name
     copy_mids_by_notetype_base_name: Dict[str, List[int]] = dict()
     for notetype_base_name in projekt_anki_notetype_names():
-        if mw.col.models.by_name(notetype_base_name) is None:
+        versions = notetype_version_index.versions(notetype_base_name)
+        if not any(version.kind == BASE_VERSION for version in versions):
             continue
 
         notetype_copy_mids = [
-            x.id
-            for x in mw.col.models.all_names_and_ids()
-            if re.match(
-                NOTETYPE_COPY_RE.format(notetype_base_name=notetype_base_name),
-                x.name,
-            )
+            version.id for version in versions if version.kind == COPY_VERSION
         ]
         if notetype_copy_mids:
             copy_mids_by_notetype_base_name[notetype_base_name] = (
@@ -64,6 +59,7 @@ def convert_extra_notetypes(
 
     future.result()  # throws an exception if there was an exception in the background task
 
+    skipped_count = 0
     for (
         notetype_base_name,
         copy_mids,
@@ -79,7 +75,11 @@ def convert_extra_notetypes(
             new_model["name"] = model_copy["name"]  # to prevent duplicates
             new_model["usn"] = -1  # triggers full sync
             new_model["flds"] = adjust_fields(model_copy["flds"], new_model["flds"])
-            mw.col.models.update_dict(new_model)
+            # copies that are already exactly like the notetype are not written again
+            if notetype_fingerprint(new_model) != notetype_fingerprint(model_copy):
+                mw.col.models.update_dict(new_model)
+            else:
+                skipped_count += 1
 
             # change the notes of type <notetype_copy> to type <notetype>
             nids_with_notetype_copy_type = mw.col.find_notes(
@@ -96,5 +96,8 @@ def convert_extra_notetypes(
             # remove the notetype copy
             mw.col.models.remove(copy_mid)  # type: ignore
 
+    notetype_version_index.invalidate()
+
+    print(f"converted notetype copies, {skipped_count} were already like the notetype")
     mw.reset()
     tooltip("Notiztypen wurden erfolgreich konvertiert.")
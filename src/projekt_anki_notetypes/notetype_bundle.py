@@ -0,0 +1,205 @@
+import hashlib
+import json
+import struct
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+# The bundle is a single file that contains everything the add-on needs to know about
+# the shipped notetypes, so that it can be loaded with one read instead of reading and
+# scanning every file in the note_types folder.
+# It is generated by scripts/build_notetype_bundle.py when the add-on is built.
+#
+# Layout:
+#   BUNDLE_MAGIC
+#   header length (8 bytes, big endian)
+#   header (json)
+#   blobs (utf-8 text of the templates and model jsons, referenced by offsets in the header)
+BUNDLE_MAGIC = b"ANKIZIN-NOTETYPE-BUNDLE\n"
+# 2: the disable field setting configs locate the field with "conditional_field"
+# 3: content hashes of the templates and css of every notetype
+# 4: size, mtime and sha256 of every source file
+# 5: no source files for bundles built for a release
+BUNDLE_FORMAT_VERSION = 5
+BUNDLE_FILE_NAME = "notetypes.bundle"
+
+# template parts stored as blobs, the file they come from is relative to the notetype folder
+BUNDLE_PARTS = {
+    "front": "Front Template.html",
+    "back": "Back Template.html",
+    "css": "Styling.css",
+    "model": "{notetype_name}.json",
+}
+
+
+class NotetypeBundleException(Exception):
+    pass
+
+
+class NotetypeBundle:
+    def __init__(self, data: bytes):
+        if not data.startswith(BUNDLE_MAGIC):
+            raise NotetypeBundleException("not a notetype bundle")
+
+        header_start = len(BUNDLE_MAGIC) + 8
+        (header_len,) = struct.unpack(
+            ">Q", data[len(BUNDLE_MAGIC) : header_start]
+        )
+        try:
+            self._header = json.loads(
+                data[header_start : header_start + header_len].decode("utf-8")
+            )
+        except ValueError as e:
+            raise NotetypeBundleException(e)
+
+        if self._header.get("format") != BUNDLE_FORMAT_VERSION:
+            raise NotetypeBundleException(
+                f"unsupported bundle format: {self._header.get('format')}"
+            )
+
+        self._data = data
+        self._blobs_start = header_start + header_len
+        self._texts: Dict[Tuple[str, str], str] = dict()
+
+    @classmethod
+    def load(cls, path: Path) -> "NotetypeBundle":
+        return cls(path.read_bytes())
+
+    def names(self) -> List[str]:
+        return list(self._header["notetypes"].keys())
+
+    def text(self, notetype_name: str, part: str) -> str:
+        # blobs are decoded on first access and then kept, most of them are never needed
+        key = (notetype_name, part)
+        result = self._texts.get(key)
+        if result is None:
+            offset, length = self._header["notetypes"][notetype_name][part]
+            start = self._blobs_start + offset
+            result = self._data[start : start + length].decode("utf-8")
+            self._texts[key] = result
+        return result
+
+    def version(self, notetype_name: str) -> Optional[str]:
+        return self._header["notetypes"][notetype_name]["version"]
+
+    def content_hashes(self, notetype_name: str) -> Dict[str, Any]:
+        # see NotetypeRegistry.content_hashes
+        return dict(self._header["notetypes"][notetype_name]["content_hashes"])
+
+    def configurable_fields(self, notetype_name: str) -> List[str]:
+        return list(
+            self._header["notetypes"][notetype_name]["configurable_fields"]
+        )
+
+    def button_shortcuts(self, notetype_name: str) -> List[Tuple[str, str]]:
+        return [
+            (btn_name, shortcut)
+            for btn_name, shortcut in self._header["notetypes"][notetype_name][
+                "button_shortcuts"
+            ]
+        ]
+
+    def field_setting_configs(self) -> List[Tuple[str, Dict[str, Any]]]:
+        # json has no tuples, the only list values in the configs are tuples (wrap_into)
+        return [
+            (
+                setting_name,
+                {
+                    key: tuple(value) if isinstance(value, list) else value
+                    for key, value in config.items()
+                },
+            )
+            for setting_name, config in self._header["field_setting_configs"]
+        ]
+
+    def is_stale(self, notetypes_path: Path) -> bool:
+        """Returns True if the content of one of the source files the bundle was built
+        from changed, which means that the bundle is outdated.
+        Bundles built for a release don't record their source files and are never stale,
+        the files of an installed add-on only change together with the bundle.
+        Only files with the same size but another mtime than when the bundle was built
+        are read, e.g. after an edit that didn't change the length of the file.
+        Source files that don't exist are ignored."""
+        sources = self._header["sources"]
+        if sources is None:
+            return False
+
+        for relative_path, (size, mtime_ns, content_hash) in sources.items():
+            path = notetypes_path / relative_path
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            if stat.st_size != size:
+                return True
+            if stat.st_mtime_ns != mtime_ns and _file_hash(path) != content_hash:
+                return True
+        return False
+
+
+def _file_hash(path: Path) -> str:
+    return hashlib.sha256(path.read_bytes()).hexdigest()
+
+
+def write_bundle(
+    path: Path,
+    notetypes_path: Path,
+    notetypes: Dict[str, Dict[str, Any]],
+    field_setting_configs: List[Tuple[str, Dict[str, Any]]],
+    record_sources: bool = True,
+) -> None:
+    """Writes a bundle file to path.
+    notetypes maps notetype names to dicts with the texts for each of BUNDLE_PARTS and
+    the "version", "configurable_fields", "button_shortcuts" and "content_hashes" of
+    the notetype.
+    If record_sources is False, the bundle is not checked against the source files
+    when it is loaded (see NotetypeBundle.is_stale), which is what releases use."""
+    blobs: List[bytes] = []
+    offset = 0
+    header_notetypes: Dict[str, Dict[str, Any]] = dict()
+    # relative path -> [size, mtime_ns, sha256] (see NotetypeBundle.is_stale)
+    sources: Dict[str, List[Any]] = dict()
+    for notetype_name, notetype in notetypes.items():
+        entry = {
+            "version": notetype["version"],
+            "configurable_fields": notetype["configurable_fields"],
+            "button_shortcuts": notetype["button_shortcuts"],
+            "content_hashes": notetype["content_hashes"],
+        }
+        for part, file_name in BUNDLE_PARTS.items():
+            blob = notetype[part].encode("utf-8")
+            entry[part] = [offset, len(blob)]
+            blobs.append(blob)
+            offset += len(blob)
+
+            if not record_sources:
+                continue
+            relative_path = (
+                Path(notetype_name)
+                / file_name.format(notetype_name=notetype_name)
+            ).as_posix()
+            source_path = notetypes_path / relative_path
+            stat = source_path.stat()
+            sources[relative_path] = [
+                stat.st_size,
+                stat.st_mtime_ns,
+                _file_hash(source_path),
+            ]
+        header_notetypes[notetype_name] = entry
+
+    header = json.dumps(
+        {
+            "format": BUNDLE_FORMAT_VERSION,
+            "sources": sources if record_sources else None,
+            "notetypes": header_notetypes,
+            "field_setting_configs": field_setting_configs,
+        },
+        ensure_ascii=False,
+        separators=(",", ":"),
+    ).encode("utf-8")
+
+    with open(path, "wb") as f:
+        f.write(BUNDLE_MAGIC)
+        f.write(struct.pack(">Q", len(header)))
+        f.write(header)
+        for blob in blobs:
+            f.write(blob)
@@ -0,0 +1,215 @@
+import hashlib
+import json
+from copy import deepcopy
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from .constants import (
+    ANKIHUB_CSS_END_COMMENT_RE,
+    ANKIHUB_HTML_END_COMMENT_RE,
+    NOTETYPE_VERSION_RE,
+)
+from .notetype_bundle import NotetypeBundle, NotetypeBundleException
+
+try:
+    from anki.models import NotetypeDict  # pylint: disable=unused-import
+except:
+    pass
+
+
+class _CachedFile(NamedTuple):
+    mtime_ns: int
+    size: int
+    sha256: str
+    text: str
+
+
+def notetype_content_hash(text: str, is_css: bool = False) -> str:
+    """Returns the sha256 of a template or the css of a notetype.
+    The AnkiHub end comment, the text below it and trailing whitespace are not part of
+    the hash, because they are added or kept when a notetype in the collection is
+    updated (see utils._updated_note_type_content)."""
+    end_comment_re = (
+        ANKIHUB_CSS_END_COMMENT_RE if is_css else ANKIHUB_HTML_END_COMMENT_RE
+    )
+    content = end_comment_re.sub("", text).rstrip("\n ")
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def notetype_content_hashes(model: "NotetypeDict") -> Dict[str, Any]:
+    # {"css": hash, "templates": [[front hash, back hash] for every template]}
+    return {
+        "css": notetype_content_hash(model["css"], is_css=True),
+        "templates": [
+            [
+                notetype_content_hash(template["qfmt"]),
+                notetype_content_hash(template["afmt"]),
+            ]
+            for template in model["tmpls"]
+        ],
+    }
+
+
+class NotetypeRegistry:
+    """Serves the notetypes shipped with the add-on from memory.
+
+    If a bundle file built by scripts/build_notetype_bundle.py exists at bundle_path,
+    everything is served from it and the notetype folders are not read at all.
+
+    Otherwise every file of a notetype folder is read once. A file is only read again
+    when its mtime or size changes and its content is only replaced if its hash changed,
+    so callers keep getting the same string objects for unchanged files.
+    """
+
+    def __init__(self, path: Path, bundle_path: Optional[Path] = None) -> None:
+        self.path = path
+        self.bundle_path = bundle_path
+        # hits: served from memory, misses: had to be read from disk
+        self.hits = 0
+        self.misses = 0
+        self._files: Dict[Path, _CachedFile] = dict()
+        self._names: Optional[List[str]] = None
+        self._names_mtime_ns: Optional[int] = None
+        # notetype name -> (model json, parsed model), the parsed model is never handed out
+        self._models: Dict[str, Tuple[str, "NotetypeDict"]] = dict()
+        self._bundle: Optional[NotetypeBundle] = None
+        self._bundle_loaded = False
+
+    def bundle(self) -> Optional[NotetypeBundle]:
+        """Returns the bundle or None if there is no (up-to-date) bundle."""
+        if self._bundle_loaded:
+            return self._bundle
+        self._bundle_loaded = True
+
+        if self.bundle_path is None or not self.bundle_path.exists():
+            return None
+
+        # an unreadable or outdated bundle is not an error, the notetype files have the
+        # same content and are read instead
+        self.misses += 1
+        try:
+            bundle = NotetypeBundle.load(self.bundle_path)
+        except (OSError, NotetypeBundleException):
+            return None
+
+        if bundle.is_stale(self.path):
+            return None
+
+        self._bundle = bundle
+        return bundle
+
+    def names(self) -> List[str]:
+        bundle = self.bundle()
+        if bundle:
+            self.hits += 1
+            return bundle.names()
+
+        mtime_ns = self.path.stat().st_mtime_ns
+        if self._names is None or mtime_ns != self._names_mtime_ns:
+            self.misses += 1
+            self._names = [x.name for x in self.path.iterdir() if x.is_dir()]
+            self._names_mtime_ns = mtime_ns
+        else:
+            self.hits += 1
+        return list(self._names)
+
+    def templates(self, notetype_name: str) -> Tuple[str, str, str]:
+        bundle = self.bundle()
+        if bundle:
+            self.hits += 1
+            return (
+                bundle.text(notetype_name, "front"),
+                bundle.text(notetype_name, "back"),
+                bundle.text(notetype_name, "css"),
+            )
+
+        folder = self.path / notetype_name
+        return (
+            self._read(folder / "Front Template.html"),
+            self._read(folder / "Back Template.html"),
+            self._read(folder / "Styling.css"),
+        )
+
+    def all_templates(self) -> Dict[str, Tuple[str, str, str]]:
+        return {name: self.templates(name) for name in self.names()}
+
+    def version(self, notetype_name: str) -> Optional[str]:
+        """Returns the shipped version of the notetype without loading its model."""
+        bundle = self.bundle()
+        if bundle:
+            self.hits += 1
+            return bundle.version(notetype_name)
+
+        front = self._read(self.path / notetype_name / "Front Template.html")
+        m = NOTETYPE_VERSION_RE.match(front)
+        if not m:
+            return None
+        return m.group(1)
+
+    def content_hashes(self, notetype_name: str) -> Dict[str, Any]:
+        """Returns the notetype_content_hashes of the shipped notetype."""
+        bundle = self.bundle()
+        if bundle:
+            self.hits += 1
+            return bundle.content_hashes(notetype_name)
+        return notetype_content_hashes(self.model(notetype_name))
+
+    def versions(self) -> Dict[str, Optional[str]]:
+        return {name: self.version(name) for name in self.names()}
+
+    def model(self, notetype_name: str) -> "NotetypeDict":
+        # the json is only parsed again when it changed, callers get a copy they can modify
+        bundle = self.bundle()
+        if bundle:
+            self.hits += 1
+            model_json = bundle.text(notetype_name, "model")
+        else:
+            model_json = self._read(
+                self.path / notetype_name / f"{notetype_name}.json"
+            )
+        cached = self._models.get(notetype_name)
+        if cached is None or cached[0] is not model_json:
+            cached = (model_json, json.loads(model_json))
+            self._models[notetype_name] = cached
+        result = deepcopy(cached[1])
+        front, back, styling = self.templates(notetype_name)
+        result["tmpls"][0]["qfmt"] = front
+        result["tmpls"][0]["afmt"] = back
+        result["css"] = styling
+        return result
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses}
+
+    def clear(self) -> None:
+        self._files.clear()
+        self._names = None
+        self._names_mtime_ns = None
+        self._models.clear()
+        self._bundle = None
+        self._bundle_loaded = False
+
+    def _read(self, path: Path) -> str:
+        stat = path.stat()
+        cached = self._files.get(path)
+        if (
+            cached
+            and cached.mtime_ns == stat.st_mtime_ns
+            and cached.size == stat.st_size
+        ):
+            self.hits += 1
+            return cached.text
+
+        self.misses += 1
+        text = path.read_text(encoding="utf-8", errors="ignore")
+        sha256 = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        if cached and cached.sha256 == sha256:
+            # only the mtime changed, keep the old string
+            text = cached.text
+        self._files[path] = _CachedFile(
+            mtime_ns=stat.st_mtime_ns,
+            size=stat.st_size,
+            sha256=sha256,
+            text=text,
+        )
+        return text
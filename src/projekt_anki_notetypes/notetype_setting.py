@@ -1,10 +1,30 @@
 import re
 from abc import ABC, abstractmethod
-from copy import deepcopy
-from typing import Any, Callable, Dict, OrderedDict, Union, List
+from copy import copy
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    List,
+    NamedTuple,
+    Optional,
+    OrderedDict,
+    Tuple,
+    Type,
+    Union,
+)
 
 from .ankiaddonconfig import ConfigLayout, ConfigManager
-from .notetype_setting_definitions import projekt_anki_notetype_names
+from .field_blocks import FieldBlock
+from .notetype_setting_definitions import (
+    projekt_anki_notetype_names,
+    setting_configs,
+)
+from .notetype_setting_spec import SettingMatch, SettingSpec
+from .setting_locator import SIDES_FOR_FILE, SettingLocator
+from .settings_cache import settings_cache
+from .template_editor import TemplateEditor, minimal_edit
+from .template_parse import template_parse
 
 try:
     from anki.models import NotetypeDict  # pylint: disable=unused-import
@@ -12,39 +32,38 @@ except:
     pass
 
 
+# value different from all other values, used for settings without a value
+NO_VALUE = object()
+
+_setting_locator: Optional[SettingLocator] = None
+
+
+def setting_locator() -> SettingLocator:
+    # created on first use because setting_configs is built lazily
+    global _setting_locator
+    if _setting_locator is None:
+        _setting_locator = SettingLocator(
+            (SettingSpec.for_config(config) for config in setting_configs.values()),
+            persistent_cache=settings_cache(),
+        )
+    return _setting_locator
+
+
 class NotetypeSetting(ABC):
     def __init__(self, config: Dict):
         self.config = config
+        # compiled patterns, shared by all NotetypeSettings for the same config
+        self.spec = SettingSpec.for_config(config)
         self.register_general_setting_hook: Union[Callable, None] = None
 
     @staticmethod
     def from_config(config: Dict) -> "NotetypeSetting":
-        if config["type"] == "checkbox":
-            return CheckboxSetting(config)
-        if config["type"] == "re_checkbox":
-            return ReCheckboxSetting(config)
-        if config["type"] == "wrap_checkbox":
-            return WrapCheckboxSetting(config)
-        if config["type"] == "text":
-            return LineEditSetting(config)
-        if config["type"] == "number":
-            return NumberEditSetting(config)
-        if config["type"] == "shortcut":
-            return ShortcutSetting(config)
-        if config["type"] == "dropdown":
-            return DropdownSetting(config)
-        if config["type"] == "useraction":
-            return UserActionSetting(config)
-        if config["type"] == "color":
-            return ColorSetting(config)
-        if config["type"] == "font_family":
-            return FontFamilySetting(config)
-        if config["type"] == "order":
-            return ElementOrderSetting(config)
-        else:
+        setting_class = SETTING_CLASSES.get(config.get("type"))
+        if setting_class is None:
             raise Exception(
                 f"unkown NotetypeSetting type: {config.get('type', 'None')}"
             )
+        return setting_class(config)
 
     @abstractmethod
     def add_widget_to_config_layout(
@@ -62,18 +81,22 @@ class NotetypeSetting(ABC):
 
     def register_general_setting(self, conf: ConfigManager):
         def update_all(key, value):
-            if self.key("general") != key:
-                return
-
             # sets the config value for all anking notetypes
             # even if they dont have this setting available
             # (in this case it will be ignored)
-            for notetype_base_name in projekt_anki_notetype_names():
-                conf.set(self.key(notetype_base_name), value)
-            conf.config_window.update_widgets()
+            notetype_keys = [
+                self.key(notetype_base_name)
+                for notetype_base_name in projekt_anki_notetype_names()
+            ]
+            with conf.batch():
+                for notetype_key in notetype_keys:
+                    conf.set(notetype_key, value)
+                # only the widgets of the changed settings, once for all general
+                # settings changed in the same batch
+                conf.config_window.queue_widget_updates(notetype_keys)
 
         self.register_general_setting_hook = update_all
-        conf.on_change(update_all)
+        conf.on_change(update_all, key=self.key("general"))
 
     def unregister_general_setting(self, conf: ConfigManager):
         assert (
@@ -83,9 +106,14 @@ class NotetypeSetting(ABC):
 
     def is_present(self, model: "NotetypeDict") -> bool:
         # returns True if the section related to the setting is present on the model
+        # all settings are looked up at once here, because this is called for all
+        # settings on the same model when the settings of a notetype are read in
         return all(
-            bool(re.search(self.config["regex"], relevant_template_text))
-            for relevant_template_text in self._relevant_template_texts(model)
+            self._match(side, relevant_template_text, scan_all=True) is not None
+            for side, relevant_template_text in zip(
+                SIDES_FOR_FILE[self.spec.file],
+                self._relevant_template_texts(model),
+            )
         )
 
     # can raise NotetypeSettingException
@@ -93,8 +121,21 @@ class NotetypeSetting(ABC):
         try:
             # does not matter how many templates the notetype has
             # because the setting is the same for all of them
-            section = self._relevant_template_sections(model)[0][0]
-            result = self._extract_setting_value(section)
+            model = _model_with_shared_texts(model)
+            section = self._relevant_template_sections(model, scan_all=True)[0][0]
+
+            # the value only depends on the text the section is in
+            cache = setting_locator().persistent_cache
+            parse = template_parse(self._relevant_template_texts(model)[0])
+            result = (
+                NO_VALUE
+                if cache is None
+                else cache.value(parse, self.name(), NO_VALUE)
+            )
+            if result is NO_VALUE:
+                result = self._extract_setting_value(section)
+                if cache is not None:
+                    cache.set_value(parse, self.name(), result)
         except NotetypeSettingException as e:
             raise e
         except Exception as e:
@@ -108,35 +149,69 @@ class NotetypeSetting(ABC):
         notetype_base_name: str,
         conf: ConfigManager,
     ) -> "NotetypeDict":
-        result = deepcopy(model)
+        result = _model_with_shared_texts(model)
         sections = self._relevant_template_sections(result)
-        key = self.key(notetype_base_name)
 
-        # if the setting is not in the config,
-        # use the default value if present else don't change anything
-        no_value = object()  # value different from all other values
-        setting_value = conf.get(key, self.config.get("default", no_value))
-        if setting_value is no_value:
+        setting_value = self.conf_value(notetype_base_name, conf)
+        if setting_value is NO_VALUE:
             return result
 
-        templates = result["tmpls"]
+        self._apply(result, sections, setting_value)
+        return result
+
+    def conf_value(self, notetype_base_name: str, conf: ConfigManager) -> Any:
+        # if the setting is not in the config, returns the default value if present
+        # else NO_VALUE (in that case the notetype should not be changed)
+        return conf.get(
+            self.key(notetype_base_name), self.config.get("default", NO_VALUE)
+        )
+
+    # can raise NotetypeSettingException, the model is not changed in that case
+    def _apply(
+        self,
+        model: "NotetypeDict",
+        sections: List[List[str]],
+        setting_value: Any,
+    ) -> None:
+        # changes the model in place
+        templates = model["tmpls"]
         # all the AnKing notetypes have one template each
         # ProjektAnki notetypes may have multiple templates
         assert len(templates) >= 1
         assert len(templates) == len(sections)
 
+        # the templates of notetypes with multiple templates mostly have the same
+        # sections, so every distinct section is only processed once
+        processed_sections: Dict[str, Optional[str]] = dict()
+        # identical template texts are the same object (see _share_identical_texts)
+        # and are only updated once
+        updated_texts_cache: Dict[Tuple[int, str], str] = dict()
+        # the templates are only changed when all of them could be processed
+        template_updates: List[Tuple[Dict, str, str]] = []
+        css = model["css"]
         for t_idx, (template, section) in enumerate(zip(templates, sections)):
             try:
-                processed_section = self._set_setting_value(
-                    section[0], setting_value
-                )
-
-                original_texts = self._relevant_template_texts(result, t_idx)
+                if section[0] not in processed_sections:
+                    processed_sections[section[0]] = self._set_setting_value(
+                        section[0], setting_value
+                    )
+                processed_section = processed_sections[section[0]]
+                if processed_section is None:
+                    # the setting value can't be written, the model is kept as it is
+                    return
+
+                if self.config["file"] == "style":
+                    original_texts = [css]
+                else:
+                    original_texts = self._relevant_template_texts(model, t_idx)
                 updated_texts = []
                 for original_text in original_texts:
-                    updated_texts.append(
-                        original_text.replace(section[0], processed_section, 1)
-                    )
+                    cache_key = (id(original_text), section[0])
+                    if cache_key not in updated_texts_cache:
+                        updated_texts_cache[cache_key] = original_text.replace(
+                            section[0], processed_section, 1
+                        )
+                    updated_texts.append(updated_texts_cache[cache_key])
             except NotetypeSettingException as e:
                 raise e
             except Exception as e:
@@ -145,15 +220,64 @@ class NotetypeSetting(ABC):
             # "both" is a special case, because it changes both the question and answer
             # -> works only if relevant front and back sections are exactly the same
             if self.config["file"] == "both":
-                template["qfmt"] = updated_texts[0]
-                template["afmt"] = updated_texts[1]
+                template_updates.append((template, "qfmt", updated_texts[0]))
+                template_updates.append((template, "afmt", updated_texts[1]))
             elif self.config["file"] == "front":
-                template["qfmt"] = updated_texts[0]
+                template_updates.append((template, "qfmt", updated_texts[0]))
             elif self.config["file"] == "back":
-                template["afmt"] = updated_texts[0]
+                template_updates.append((template, "afmt", updated_texts[0]))
             else:
-                result["css"] = updated_texts[0]
+                css = updated_texts[0]
+
+        for template, key, text in template_updates:
+            template[key] = text
+        model["css"] = css
 
+    # can raise NotetypeSettingException
+    def _edits(
+        self, model: "NotetypeDict", setting_value: Any
+    ) -> List["_SectionEdit"]:
+        # returns the sections of the setting in the distinct template texts of the model
+        # together with their new content, see apply_settings
+        # scan_all: the texts don't change while the edits of all settings are collected
+        sections = self._relevant_template_sections(model, scan_all=True)
+        processed_sections: Dict[str, Optional[str]] = dict()
+        result = []
+        text_ids = set()
+        for t_idx, section in enumerate(sections):
+            try:
+                if section[0] not in processed_sections:
+                    processed_sections[section[0]] = self._set_setting_value(
+                        section[0], setting_value
+                    )
+                processed_section = processed_sections[section[0]]
+                if processed_section is None:
+                    # the setting value can't be written, e.g. a custom user action,
+                    # the section is kept as it is
+                    continue
+
+                for text in self._relevant_template_texts(model, t_idx):
+                    if id(text) in text_ids:
+                        continue
+                    text_ids.add(id(text))
+
+                    # same as str.replace(section, processed_section, 1)
+                    # "both" settings use the section of the front for the back too
+                    start = text.find(section[0])
+                    if start == -1:
+                        continue
+                    result.append(
+                        _SectionEdit(
+                            text=text,
+                            start=start,
+                            end=start + len(section[0]),
+                            replacement=processed_section,
+                        )
+                    )
+            except NotetypeSettingException as e:
+                raise e
+            except Exception as e:
+                raise NotetypeSettingException(e)
         return result
 
     def name(self):
@@ -163,24 +287,36 @@ class NotetypeSetting(ABC):
         # returns the config key of this setting for the notetype in the config
         return f"{notetype_base_name}.{self.name()}"
 
-    def _relevant_template_sections(self, model: "NotetypeDict") -> List[str]:
+    def _relevant_template_sections(
+        self, model: "NotetypeDict", scan_all: bool = False
+    ) -> List[List[str]]:
         results = []
+        # id of template text -> section
+        # (identical texts are the same object, see _share_identical_texts)
+        sections_by_text: Dict[int, str] = dict()
         # if the notetype has multiple templates, we need to check all of them
         # to find the correct section
         for t_idx, _ in enumerate(model["tmpls"]):
             template_texts = self._relevant_template_texts(model, t_idx)
             section_results = []
-            for section in template_texts:
-                section_match = re.search(self.config["regex"], section)
-                if not section_match:
-                    raise NotetypeSettingException(
-                        f"could not find '{self.config['text']}' in {self.config['file']}"
-                        f"template of notetype '{model['name']}'"
-                    )
-                section_results.append(section_match.group(0))
+            for side, section in zip(SIDES_FOR_FILE[self.spec.file], template_texts):
+                if id(section) not in sections_by_text:
+                    section_match = self._match(side, section, scan_all)
+                    if not section_match:
+                        raise NotetypeSettingException(
+                            f"could not find '{self.config['text']}' in {self.config['file']}"
+                            f"template of notetype '{model['name']}'"
+                        )
+                    sections_by_text[id(section)] = section_match.group(0)
+                section_results.append(sections_by_text[id(section)])
             results.append(section_results)
         return results
 
+    def _match(
+        self, side: str, template_text: str, scan_all: bool = False
+    ) -> Optional[SettingMatch]:
+        return setting_locator().match(self.spec, side, template_text, scan_all)
+
     # raises NotetypeSettingException if the current setting value is
     # not of the expected form and has to be changed for the notetype to work
     @abstractmethod
@@ -215,7 +351,7 @@ class NotetypeSetting(ABC):
     def _replace_first_capture_group(
         self, section: str, new_value_str: Any
     ) -> str:
-        m = re.search(self.config["regex"], section)
+        m = self.spec.regex.search(section)
         start, end = m.span(1)
         result = section[:start] + new_value_str + section[end:]
         return result
@@ -225,6 +361,13 @@ class NotetypeSettingException(Exception):
     pass
 
 
+class _SectionEdit(NamedTuple):
+    text: str
+    start: int
+    end: int
+    replacement: str
+
+
 class ReCheckboxSetting(NotetypeSetting):
     def add_widget_to_config_layout(
         self,
@@ -306,7 +449,7 @@ class CheckboxSetting(NotetypeSetting):
         )
 
     def _extract_setting_value(self, section: str) -> Any:
-        value = re.search(self.config["regex"], section).group(1)
+        value = self.spec.regex.search(section).group(1)
         if value not in ["true", "false"]:
             raise NotetypeSettingException(
                 f"{self.config['text']}: expected 'true' or 'false' but got '{value}'"
@@ -332,7 +475,7 @@ class LineEditSetting(NotetypeSetting):
         )
 
     def _extract_setting_value(self, section: str) -> Any:
-        return re.search(self.config["regex"], section).group(1)
+        return self.spec.regex.search(section).group(1)
 
     def _set_setting_value(self, section: str, setting_value: Any) -> str:
         new_value_str = setting_value.replace('"', '\\"')
@@ -354,7 +497,7 @@ class FontFamilySetting(NotetypeSetting):
 
     def _extract_setting_value(self, section: str) -> Any:
         # dont need to verify, because used in css and will be ignored if not valid
-        return re.search(self.config["regex"], section).group(1)
+        return self.spec.regex.search(section).group(1)
 
     def _set_setting_value(self, section: str, setting_value: Any) -> str:
         return self._replace_first_capture_group(section, setting_value)
@@ -376,7 +519,7 @@ class DropdownSetting(NotetypeSetting):
         )
 
     def _extract_setting_value(self, section: str) -> Any:
-        result = re.search(self.config["regex"], section).group(1)
+        result = self.spec.regex.search(section).group(1)
         if result not in self.config["options"]:
             raise NotetypeSettingException(
                 f"{self.config['text']}: expected one of {self.config['options']} but got {result}"
@@ -389,13 +532,14 @@ class DropdownSetting(NotetypeSetting):
 
 class UserActionSetting(DropdownSetting):
     def _extract_setting_value(self, section: str) -> Any:
-        result = re.search(self.config["regex"], section).group(1)
+        result = self.spec.regex.search(section).group(1)
         if result not in self.config["options"]:
             # Note that custom actions will also be lableled as "None"
             return "custom"
         return result
 
-    def _set_setting_value(self, section: str, setting_value: Any) -> str:
+    def _set_setting_value(self, section: str, setting_value: Any) -> Optional[str]:
+        # custom user actions are not changed
         if setting_value != "custom":
             return self._replace_first_capture_group(section, setting_value)
         return None
@@ -416,7 +560,7 @@ class ColorSetting(NotetypeSetting):
 
     def _extract_setting_value(self, section: str) -> Any:
         # dont need to verify, because used in css and will be ignored if not valid
-        color_str = re.search(self.config["regex"], section).group(1)
+        color_str = self.spec.regex.search(section).group(1)
         return color_str
 
     def _set_setting_value(self, section: str, setting_value: Any) -> str:
@@ -445,7 +589,7 @@ class ShortcutSetting(NotetypeSetting):
 
     def _extract_setting_value(self, section: str) -> Any:
         # dont need to verify, because notetype js will ignore the shortcut if its invalid
-        shortcut_str = re.search(self.config["regex"], section).group(1)
+        shortcut_str = self.spec.regex.search(section).group(1)
         return shortcut_str
 
     def _set_setting_value(self, section: str, setting_value: Any) -> str:
@@ -471,7 +615,7 @@ class NumberEditSetting(NotetypeSetting):
         )
 
     def _extract_setting_value(self, section: str) -> Any:
-        value_str = re.search(self.config["regex"], section).group(1)
+        value_str = self.spec.regex.search(section).group(1)
         try:
             if self.config.get("decimal", False):
                 result = float(value_str)
@@ -521,8 +665,8 @@ class ElementOrderSetting(NotetypeSetting):
             )
 
         for i, name in enumerate(setting_value):
-            old: re.Match = name_to_match[list(name_to_match.keys())[i]]
-            new: re.Match = name_to_match[name]
+            old = name_to_match[list(name_to_match.keys())[i]]
+            new = name_to_match[name]
             start, end = old.span()
             result = (
                 result[: start + offset] + new.group(0) + result[end + offset :]
@@ -532,11 +676,11 @@ class ElementOrderSetting(NotetypeSetting):
 
     def _name_to_match_odict(
         self, section_text: str
-    ) -> OrderedDict[str, re.Match]:
+    ) -> OrderedDict[str, FieldBlock]:
         matches = [
-            m
-            for m in re.finditer(self.config["elem_re"], str(section_text))
-            if re.search(self.config["has_to_contain"], m.group(0))
+            block
+            for block in template_parse(section_text).field_blocks().conditional_fields()
+            if self.spec.has_to_contain.search(block.group(0))
         ]
         result = OrderedDict(
             [(self._get_element_name(m.group(0)), m) for m in matches]
@@ -544,9 +688,8 @@ class ElementOrderSetting(NotetypeSetting):
         return result
 
     def _get_element_name(self, element_string: str) -> str:
-        patterns = self.config["name_res"]
-        for pattern in patterns:
-            m = re.search(pattern, element_string)
+        for pattern in self.spec.name_res:
+            m = pattern.search(element_string)
             if m:
                 return m.group(1)
 
@@ -555,6 +698,129 @@ class ElementOrderSetting(NotetypeSetting):
         )
 
 
+def apply_settings(
+    model: "NotetypeDict", values: Dict[str, Any]
+) -> List[NotetypeSettingException]:
+    """Applies the setting values (setting name -> value) to the model in place.
+    Settings that can't be applied are skipped, the exceptions are returned.
+
+    The sections of all settings are located in the unchanged template texts and the
+    changes are collected as edits, so that every changed text is built only once.
+    Settings whose section overlaps the section of a setting that changed the text
+    (or of a setting that was deferred) are deferred to another pass over the
+    changed texts, so the result is the same as applying the settings one by one."""
+    _share_identical_texts(model["tmpls"])
+    exceptions = []
+    pending = [
+        (NotetypeSetting.from_config(setting_configs[setting_name]), setting_value)
+        for setting_name, setting_value in values.items()
+    ]
+    while pending:
+        # id of template text -> editor
+        editors: Dict[int, TemplateEditor] = dict()
+        deferred = []
+        for nts, setting_value in pending:
+            try:
+                edits = nts._edits(model, setting_value)
+            except NotetypeSettingException as e:
+                exceptions.append(e)
+                continue
+
+            edits_with_editors = [
+                (edit, editors.setdefault(id(edit.text), TemplateEditor(edit.text)))
+                for edit in edits
+            ]
+            if any(
+                editor.overlaps(edit.start, edit.end)
+                for edit, editor in edits_with_editors
+            ):
+                deferred.append((nts, setting_value))
+                for edit, editor in edits_with_editors:
+                    editor.reserve(edit.start, edit.end)
+                continue
+
+            for edit, editor in edits_with_editors:
+                if edit.replacement == edit.text[edit.start : edit.end]:
+                    continue
+                start, end, replacement = minimal_edit(
+                    edit.text[edit.start : edit.end], edit.replacement
+                )
+                editor.replace(edit.start + start, edit.start + end, replacement)
+                editor.reserve(edit.start, edit.end)
+
+        _write_edited_texts(model, editors)
+        pending = deferred
+
+    return exceptions
+
+
+def _write_edited_texts(
+    model: "NotetypeDict", editors: Dict[int, TemplateEditor]
+) -> None:
+    # texts that were the same object before are the same object afterwards
+    for template in model["tmpls"]:
+        for key in ("qfmt", "afmt"):
+            editor = editors.get(id(template[key]))
+            if editor and editor.has_edits():
+                template[key] = editor.text()
+    editor = editors.get(id(model["css"]))
+    if editor and editor.has_edits():
+        model["css"] = editor.text()
+
+
+def values_from_conf(
+    ntss: List[NotetypeSetting], notetype_base_name: str, conf: ConfigManager
+) -> Dict[str, Any]:
+    # returns the values of the settings for apply_settings
+    result = dict()
+    for nts in ntss:
+        setting_value = nts.conf_value(notetype_base_name, conf)
+        if setting_value is not NO_VALUE:
+            result[nts.name()] = setting_value
+    return result
+
+
+def _model_with_shared_texts(model: "NotetypeDict") -> "NotetypeDict":
+    # Only the templates are copied, because they are the only parts that are changed
+    # by updated_model (a deepcopy of a model with many templates is slow).
+    result = copy(model)
+    result["tmpls"] = [copy(template) for template in model["tmpls"]]
+    _share_identical_texts(result["tmpls"])
+    return result
+
+
+def _share_identical_texts(templates: List[Dict]) -> None:
+    # Makes identical template texts the same object, so that they can be recognized
+    # by their id instead of hashing the whole texts
+    # (texts with different lengths are never compared, so this is cheap).
+    for key in ("qfmt", "afmt"):
+        texts_by_length: Dict[int, List[str]] = dict()
+        for template in templates:
+            text = template[key]
+            same_length_texts = texts_by_length.setdefault(len(text), [])
+            for other in same_length_texts:
+                if other is text or other == text:
+                    template[key] = other
+                    break
+            else:
+                same_length_texts.append(text)
+
+
+SETTING_CLASSES: Dict[str, Type[NotetypeSetting]] = {
+    "checkbox": CheckboxSetting,
+    "re_checkbox": ReCheckboxSetting,
+    "wrap_checkbox": WrapCheckboxSetting,
+    "text": LineEditSetting,
+    "number": NumberEditSetting,
+    "shortcut": ShortcutSetting,
+    "dropdown": DropdownSetting,
+    "useraction": UserActionSetting,
+    "color": ColorSetting,
+    "font_family": FontFamilySetting,
+    "order": ElementOrderSetting,
+}
+
+
 def order_names(
     new_names: List[str],
     current_names: List[str],
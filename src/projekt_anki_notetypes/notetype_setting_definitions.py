@@ -1,7 +1,23 @@
-import json
 import re
+import threading
 from pathlib import Path
-from typing import Any, Dict, List, OrderedDict, Tuple, Union
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    OrderedDict,
+    Tuple,
+    Union,
+)
+
+from .notetype_bundle import BUNDLE_FILE_NAME
+from .notetype_registry import NotetypeRegistry
+from .notetype_setting_spec import SettingSpec
+from .template_parse import template_parse
 
 try:
     from anki.models import NotetypeDict  # pylint: disable=unused-import
@@ -10,21 +26,19 @@ except:
 
 PROJEKT_ANKI_NOTETYPES_PATH = Path(__file__).parent / "note_types"
 
-FIELD_BOUNDARY_RE = (  # noqa: E731
-    lambda ch, field_name_re: rf"(?:\{{\{{{ch}{field_name_re}\}}\}}|<span.+?PSEUDO-FIELD {ch}{field_name_re}</span>)"
+# loads the shipped notetypes once and serves them from memory
+notetype_registry = NotetypeRegistry(
+    PROJEKT_ANKI_NOTETYPES_PATH,
+    bundle_path=Path(__file__).parent / BUNDLE_FILE_NAME,
 )
 
-# Regular expression for fields for which the add-on offers settings aka configurable fields.
+# Fields for which the add-on offers settings aka configurable fields are conditional
+# field blocks ({{#Field}}...{{/Field}}, see field_blocks.py) of the back template.
 # Most of these fields are represented as hint buttons, but not all of them.
 # To be recognized by the add-on the field html needs to contain text matching
 # CONFIGURABLE_FIELD_HAS_TO_CONTAIN_RE.
 # Whether something is a hint button or not is determined by its presence in the ButtonShortcuts dict.
-# The surrounding "<!--" are needed because of the disable field setting.
-# With the default argument, the regex matches all conditional fields.
-CONDITIONAL_FIELD_RE = lambda field_name_re=".+?": (  # noqa: E731
-    rf"(?:<!-- ?)?{FIELD_BOUNDARY_RE('#', field_name_re)}[\w\W]+?{FIELD_BOUNDARY_RE('/', field_name_re)}(?: ?-->)?"
-)
-
+# The blocks include the surrounding "<!--" and "-->" because of the disable field setting.
 CONFIGURABLE_FIELD_HAS_TO_CONTAIN_RE = r'(class="hints"|id="extra")'
 
 CONFIGURABLE_FIELD_NAME_RE = r'data-name="([\w\W]+?)"'
@@ -74,15 +88,19 @@ ANKIMOBILE_USER_ACTION_LABELS = [
 ]
 
 
-setting_configs: Dict[str, Any] = OrderedDict(
+# settings that are the same for all notetypes, the settings for the configurable fields
+# are generated from the notetype templates (see setting_configs below)
+_static_setting_configs: Dict[str, Any] = OrderedDict(
     {
         "field_order": {
             "text": "Feld-Reihenfolge",
             "tooltip": "Zieh die Felder in die gewünschte Reihenfolge.",
             "type": "order",
             "file": "back",
-            "regex": r"[\w\W]*",
-            "elem_re": CONDITIONAL_FIELD_RE(),
+            # matches the whole template, like [\w\W]* but without checking each character
+            "regex": r"(?s).*",
+            # the elements are the conditional field blocks of the template
+            # that contain has_to_contain (see field_blocks.py)
             "name_res": (
                 CONFIGURABLE_FIELD_NAME_RE,
                 CONFIGURABLE_FIELD_FALLBACK_NAME_RE,
@@ -805,43 +823,19 @@ setting_configs: Dict[str, Any] = OrderedDict(
 
 
 def projekt_anki_notetype_names():
-    return list(projekt_anki_notetype_templates().keys())
+    return notetype_registry.names()
 
 
 def projekt_anki_notetype_templates() -> Dict[str, Tuple[str, str, str]]:
-    result = dict()
-    for x in PROJEKT_ANKI_NOTETYPES_PATH.iterdir():
-        if not x.is_dir():
-            continue
-        notetype_name = x.name
+    return notetype_registry.all_templates()
 
-        front_template = (x / "Front Template.html").read_text(
-            encoding="utf-8", errors="ignore"
-        )
-        back_template = (x / ("Back Template.html")).read_text(
-            encoding="utf-8", errors="ignore"
-        )
-        styling = (x / ("Styling.css")).read_text(
-            encoding="utf-8", errors="ignore"
-        )
-        result[notetype_name] = (front_template, back_template, styling)
 
-    return result
+def projekt_anki_notetype_model(notetype_name: str) -> "NotetypeDict":
+    return notetype_registry.model(notetype_name)
 
 
-def projekt_anki_notetype_model(notetype_name: str) -> "NotetypeDict":
-    result = json.loads(
-        (
-            PROJEKT_ANKI_NOTETYPES_PATH
-            / notetype_name
-            / f"{notetype_name}.json"
-        ).read_text(encoding="utf-8", errors="ignore")
-    )
-    front, back, styling = projekt_anki_notetype_templates()[notetype_name]
-    result["tmpls"][0]["qfmt"] = front
-    result["tmpls"][0]["afmt"] = back
-    result["css"] = styling
-    return result
+def projekt_anki_notetype_version(notetype_name: str) -> Optional[str]:
+    return notetype_registry.version(notetype_name)
 
 
 def projekt_anki_notetype_models() -> List["NotetypeDict"]:
@@ -852,8 +846,12 @@ def projekt_anki_notetype_models() -> List["NotetypeDict"]:
 
 
 def all_btns_setting_configs():
+    bundle = notetype_registry.bundle()
+    if bundle:
+        return OrderedDict(bundle.field_setting_configs())
+
     result = OrderedDict()
-    for notetype_name in projekt_anki_notetype_templates().keys():
+    for notetype_name in projekt_anki_notetype_names():
         fields = configurable_fields_for_notetype(notetype_name)
         for field_name in fields:
             shortcut = btn_name_to_shortcut_odict(notetype_name).get(
@@ -864,10 +862,15 @@ def all_btns_setting_configs():
 
 
 def configurable_fields_for_notetype(notetype_name: str) -> List[str]:
-    _, back, _ = projekt_anki_notetype_templates()[notetype_name]
+    bundle = notetype_registry.bundle()
+    if bundle:
+        return bundle.configurable_fields(notetype_name)
+
+    _, back, _ = notetype_registry.templates(notetype_name)
 
     result = []
-    for field in re.findall(CONDITIONAL_FIELD_RE(), back):
+    for block in template_parse(back).field_blocks().conditional_fields():
+        field = block.group(0)
         if not re.search(CONFIGURABLE_FIELD_HAS_TO_CONTAIN_RE, field):
             continue
 
@@ -885,7 +888,11 @@ def configurable_fields_for_notetype(notetype_name: str) -> List[str]:
 
 
 def btn_name_to_shortcut_odict(notetype_name):
-    _, back, _ = projekt_anki_notetype_templates()[notetype_name]
+    bundle = notetype_registry.bundle()
+    if bundle:
+        return OrderedDict(bundle.button_shortcuts(notetype_name))
+
+    _, back, _ = notetype_registry.templates(notetype_name)
 
     button_shortcuts_dict_pattern = r"var+ ButtonShortcuts *= *{([^}]*)}"
     m = re.search(button_shortcuts_dict_pattern, back)
@@ -959,17 +966,55 @@ def disable_field_setting_config(field_name, default):
         "tooltip": "",
         "type": "wrap_checkbox",
         "file": "back",
-        "regex": CONDITIONAL_FIELD_RE(field_name),
+        # the block of the field is looked up in the block tree of the template
+        "conditional_field": field_name,
         "wrap_into": ("<!--", "-->"),
         "section": "Felder",
         "default": default,
     }
 
 
-setting_configs = OrderedDict(**setting_configs, **all_btns_setting_configs())
+class _LazySettingConfigs(Mapping[str, Dict[str, Any]]):
+    """Builds the setting configs when they are first used instead of when the add-on
+    is loaded, because generating the configs for the configurable fields needs
+    the notetype templates.
+    The configs can be used from background threads, they are only built once."""
+
+    def __init__(self, build: Callable[[], Dict[str, Dict[str, Any]]]):
+        self._build = build
+        self._configs: Optional[Dict[str, Dict[str, Any]]] = None
+        # reentrant in case building the configs uses them
+        self._lock = threading.RLock()
+
+    def _get(self) -> Dict[str, Dict[str, Any]]:
+        configs = self._configs
+        if configs is not None:
+            return configs
+        with self._lock:
+            if self._configs is None:
+                self._configs = self._build()
+            return self._configs
+
+    def __getitem__(self, setting_name: str) -> Dict[str, Any]:
+        return self._get()[setting_name]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._get())
+
+    def __len__(self) -> int:
+        return len(self._get())
+
+
+def _build_setting_configs() -> Dict[str, Dict[str, Any]]:
+    result = OrderedDict(**_static_setting_configs, **all_btns_setting_configs())
+    for setting_name, setting_config in result.items():
+        setting_config["name"] = setting_name
+        # compiles and checks the config, so that broken configs fail here
+        SettingSpec.for_config(setting_config)
+    return result
+
 
-for setting_name, setting_config in setting_configs.items():
-    setting_config["name"] = setting_name
+setting_configs = _LazySettingConfigs(_build_setting_configs)
 
 # Settings that apply to multiple note types (the ones that have this setting listed in
 # settings_by_notetype).
@@ -0,0 +1,158 @@
+import re
+from types import MappingProxyType
+from typing import Any, Dict, Literal, Mapping, Optional, Protocol, Tuple
+
+from .template_parse import template_parse
+
+SETTING_TYPES = (
+    "checkbox",
+    "re_checkbox",
+    "wrap_checkbox",
+    "text",
+    "number",
+    "shortcut",
+    "dropdown",
+    "useraction",
+    "color",
+    "font_family",
+    "order",
+)
+
+SETTING_FILES = ("front", "back", "both", "style")
+
+
+class SettingSpecException(Exception):
+    pass
+
+
+class SettingMatch(Protocol):
+    """The section of a setting found in a text: a re.Match, a FieldBlock or a section
+    found by a previous search (see setting_locator.SectionMatch)."""
+
+    def span(self) -> Tuple[int, int]:
+        ...
+
+    # the settings have no groups in common
+    def group(self, __index: Literal[0] = 0) -> str:
+        ...
+
+
+class SettingSpec:
+    """The compiled form of a setting config (see notetype_setting_definitions.py).
+    The patterns are compiled once when the spec is created and the config is checked,
+    so that a broken setting config fails when the setting configs are loaded.
+
+    Use SettingSpec.for_config to get the spec for a config, there is only one spec
+    per setting. Specs are shared, so they can't be changed, config is a read-only
+    copy of the config the spec was created from."""
+
+    __slots__ = (
+        "config",
+        "name",
+        "type",
+        "file",
+        "regex",
+        "conditional_field",
+        "has_to_contain",
+        "name_res",
+    )
+
+    config: Mapping[str, Any]
+    name: str
+    type: str
+    file: str
+    regex: Optional[re.Pattern]
+    conditional_field: Optional[str]
+    has_to_contain: Optional[re.Pattern]
+    name_res: Tuple[re.Pattern, ...]
+
+    # setting name -> spec
+    _specs: Dict[str, "SettingSpec"] = dict()
+
+    def __init__(self, config: Mapping[str, Any]):
+        config = MappingProxyType(dict(config))
+        name: str = config.get("name", "")
+        setting_type: str = config.get("type", "")
+        setting_file: str = config.get("file", "")
+
+        if setting_type not in SETTING_TYPES:
+            raise SettingSpecException(
+                f"{name}: unkown NotetypeSetting type: {setting_type or 'None'}"
+            )
+        if setting_file not in SETTING_FILES:
+            raise SettingSpecException(f"{name}: unknown file: {setting_file}")
+
+        # settings of conditional fields are located with the block tree of the template
+        # instead of a regex
+        conditional_field: Optional[str] = config.get("conditional_field")
+        regex: Optional[re.Pattern] = None
+        if conditional_field is None:
+            regex = _compile(name, config.get("regex"), "regex")
+        has_to_contain: Optional[re.Pattern] = None
+        name_res: Tuple[re.Pattern, ...] = ()
+        if setting_type == "order":
+            has_to_contain = _compile(
+                name, config.get("has_to_contain"), "has_to_contain"
+            )
+            name_res = tuple(
+                _compile(name, pattern, "name_res")
+                for pattern in config.get("name_res", ())
+            )
+            if not name_res:
+                raise SettingSpecException(f"{name}: name_res is missing")
+        elif setting_type == "wrap_checkbox":
+            if len(config.get("wrap_into", ())) != 2:
+                raise SettingSpecException(
+                    f"{name}: wrap_into has to be a (start, end) pair"
+                )
+        elif setting_type in ("dropdown", "useraction"):
+            if not config.get("options"):
+                raise SettingSpecException(f"{name}: options are missing")
+        elif setting_type == "re_checkbox":
+            if not config.get("replacement_pairs"):
+                raise SettingSpecException(f"{name}: replacement_pairs are missing")
+
+        for attribute, value in (
+            ("config", config),
+            ("name", name),
+            ("type", setting_type),
+            ("file", setting_file),
+            ("regex", regex),
+            ("conditional_field", conditional_field),
+            ("has_to_contain", has_to_contain),
+            ("name_res", name_res),
+        ):
+            object.__setattr__(self, attribute, value)
+
+    def __setattr__(self, attribute: str, value: Any) -> None:
+        raise AttributeError(f"{self.name}: a SettingSpec can't be changed")
+
+    def __delattr__(self, attribute: str) -> None:
+        raise AttributeError(f"{self.name}: a SettingSpec can't be changed")
+
+    def search(
+        self, text: str, pos: int = 0
+    ) -> Optional[SettingMatch]:
+        # returns the section of the setting in the text, like regex.search
+        if self.conditional_field is not None:
+            block = template_parse(text).field_blocks().find(self.conditional_field)
+            return block if block is not None and block.start >= pos else None
+        return self.regex.search(text, pos)
+
+    @classmethod
+    def for_config(cls, config: Mapping[str, Any]) -> "SettingSpec":
+        spec = cls._specs.get(config.get("name"))
+        if spec is None:
+            spec = cls(config)
+            if spec.name:
+                cls._specs[spec.name] = spec
+        return spec
+
+
+def _compile(setting_name: str, pattern: Any, key: str) -> re.Pattern:
+    if not isinstance(pattern, str):
+        raise SettingSpecException(f"{setting_name}: {key} is missing")
+    try:
+        return re.compile(pattern)
+    except re.error as e:
+        raise SettingSpecException(f"{setting_name}: invalid {key}: {e}")
@@ -0,0 +1,129 @@
+import re
+import threading
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List, NamedTuple, Optional
+
+from aqt import mw
+
+from .constants import ANKIHUB_NOTETYPE_RE, NOTETYPE_COPY_RE
+from .notetype_setting_definitions import projekt_anki_notetype_names
+
+if TYPE_CHECKING:
+    from anki.collection import OpChanges
+
+try:
+    from anki.models import NotetypeDict  # pylint: disable=unused-import
+except:
+    pass
+
+# kinds of versions of a notetype in the collection
+BASE_VERSION = "base"
+# created by the AnkiHub add-on
+ANKIHUB_VERSION = "ankihub"
+# created by copying the notetype or importing it from different sources
+COPY_VERSION = "copy"
+
+
+class NotetypeVersion(NamedTuple):
+    id: int
+    name: str
+    base_name: str
+    kind: str
+
+
+def notetype_versions_by_base_name(
+    names_and_ids: Iterable[Any], base_names: List[str]
+) -> Dict[str, List[NotetypeVersion]]:
+    """Returns the versions of the notetypes with the base names, in the order of
+    names_and_ids (objects with name and id attributes, like the ones returned by
+    mw.col.models.all_names_and_ids).
+    All names are matched against one regex, so this is one pass over the notetypes."""
+    result: Dict[str, List[NotetypeVersion]] = {
+        base_name: [] for base_name in base_names
+    }
+    if not base_names:
+        return result
+
+    # longer base names first, so that a base name that starts with another one
+    # isn't taken for a version of the other one
+    base_names_re = "|".join(
+        re.escape(base_name)
+        for base_name in sorted(base_names, key=len, reverse=True)
+    )
+    version_re = re.compile(
+        rf"(?P<base_name>{base_names_re})"
+        rf"(?:(?P<ankihub>{ANKIHUB_NOTETYPE_RE.format(notetype_base_name='')})"
+        rf"|(?P<copy>{NOTETYPE_COPY_RE.format(notetype_base_name='')})"
+        r"|$)"
+    )
+    for x in names_and_ids:
+        m = version_re.match(x.name)
+        if not m:
+            continue
+        if m.group("ankihub"):
+            kind = ANKIHUB_VERSION
+        elif m.group("copy"):
+            kind = COPY_VERSION
+        else:
+            kind = BASE_VERSION
+        base_name = m.group("base_name")
+        result[base_name].append(NotetypeVersion(x.id, x.name, base_name, kind))
+    return result
+
+
+class NotetypeVersionIndex:
+    """Knows which notetypes in the collection are versions of the notetypes of the
+    add-on. The model dicts are only fetched from the collection when they are needed.
+
+    The index is built when it is first used and has to be invalidated when notetypes are
+    added, removed or renamed (see on_operation_did_execute)."""
+
+    def __init__(self) -> None:
+        self._versions: Optional[Dict[str, List[NotetypeVersion]]] = None
+        self._base_names_by_name: Dict[str, str] = dict()
+        # the index is also used while reading in settings in the background
+        self._lock = threading.Lock()
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._versions = None
+
+    def versions(self, notetype_base_name: str) -> List[NotetypeVersion]:
+        return self._get_versions().get(notetype_base_name, [])
+
+    def models(self, notetype_base_name: str) -> List["NotetypeDict"]:
+        return [
+            mw.col.models.get(version.id)  # type: ignore
+            for version in self.versions(notetype_base_name)
+        ]
+
+    def base_name(self, notetype_name: str) -> Optional[str]:
+        self._get_versions()
+        return self._base_names_by_name.get(notetype_name)
+
+    def names(self) -> List[str]:
+        return [
+            version.name
+            for versions in self._get_versions().values()
+            for version in versions
+        ]
+
+    def _get_versions(self) -> Dict[str, List[NotetypeVersion]]:
+        with self._lock:
+            if self._versions is None:
+                self._versions = notetype_versions_by_base_name(
+                    mw.col.models.all_names_and_ids(), projekt_anki_notetype_names()
+                )
+                self._base_names_by_name = {
+                    version.name: version.base_name
+                    for versions in self._versions.values()
+                    for version in versions
+                }
+            return self._versions
+
+
+notetype_version_index = NotetypeVersionIndex()
+
+
+def on_operation_did_execute(changes: "OpChanges", handler: Optional[object]) -> None:
+    if changes.notetype:
+        notetype_version_index.invalidate()
@@ -0,0 +1,255 @@
+import re
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .notetype_setting_spec import SettingMatch, SettingSpec
+from .settings_cache import SettingsParseCache
+from .template_parse import TemplateParse, template_parse
+
+try:
+    import re._parser as sre_parse  # type: ignore
+except ImportError:
+    import sre_parse  # type: ignore
+
+# parts of a notetype a setting can be located in, "both" settings are in front and back
+SIDES_FOR_FILE = {
+    "front": ("front",),
+    "back": ("back",),
+    "both": ("front", "back"),
+    "style": ("style",),
+}
+
+# (literal, max number of characters a match can have before the literal)
+Anchor = Tuple[str, int]
+
+
+class SettingLocator:
+    """Finds the sections of all settings in a template text at once.
+
+    Most settings regexes contain a literal (e.g. the name of a js variable) that every
+    match has to contain. The anchors of all settings of a side are looked up once per
+    text, so that a settings regex is only run if its anchor is in the text and only
+    from shortly before the first occurrence of the anchor.
+    The result is the same as running spec.search(text) for every setting.
+    Settings of conditional fields have no regex, their sections are looked up in the
+    block tree of the text (see field_blocks.py).
+
+    The results are stored in the parse of the text (see template_parse.py), so
+    is_present, setting_value and updated_model of all settings share one scan of each
+    template and texts with the same content are only scanned once.
+    """
+
+    def __init__(
+        self,
+        specs: Iterable[SettingSpec],
+        persistent_cache: Optional[SettingsParseCache] = None,
+    ):
+        # if there is a persistent cache, the spans of the sections found by full scans
+        # are stored in it and reused for texts with the same content
+        self.persistent_cache = persistent_cache
+        self._specs: Dict[str, Dict[str, SettingSpec]] = {
+            side: OrderedDict() for side in ("front", "back", "style")
+        }
+        self._anchors: Dict[str, Optional[List[Anchor]]] = dict()
+        for spec in specs:
+            self._anchors[spec.name] = (
+                _anchors(spec.regex) if spec.regex is not None else None
+            )
+            for side in SIDES_FOR_FILE[spec.file]:
+                self._specs[side][spec.name] = spec
+
+        # the distinct anchors of all settings of a side
+        self._side_anchors: Dict[str, List[str]] = {
+            side: list(
+                OrderedDict.fromkeys(
+                    literal
+                    for spec in side_specs.values()
+                    for literal, _ in self._anchors[spec.name] or []
+                )
+            )
+            for side, side_specs in self._specs.items()
+        }
+
+    def match(
+        self, spec: SettingSpec, side: str, text: str, scan_all: bool = False
+    ) -> Optional[SettingMatch]:
+        """Returns spec.search(text).
+        Uses the results of a previous scan of the text if there is one. If scan_all is
+        True, the text is scanned for all settings (see matches) so that looking up
+        the other settings in the same text is cheap."""
+        if self._specs[side].get(spec.name) is not spec:
+            # the spec was not known when the locator was created
+            return spec.search(text)
+
+        matches = self._cached_matches(side, text)
+        if matches is None and scan_all:
+            matches = self.matches(side, text)
+        if matches is not None:
+            return matches[spec.name]
+
+        first_positions = {
+            literal: pos
+            for literal, _ in self._anchors[spec.name] or []
+            for pos in (text.find(literal),)
+            if pos != -1
+        }
+        return self._search(spec, text, first_positions)
+
+    def matches(self, side: str, text: str) -> Dict[str, Optional[SettingMatch]]:
+        """Returns the result of spec.search(text) for all settings of the side."""
+        parse = template_parse(text)
+        result = parse.setting_matches.get((self, side))
+        if result is not None:
+            return result
+
+        result = self._stored_matches(parse, side)
+        if result is None:
+            first_positions = self._scan_anchors(side, text)
+            result = {
+                spec.name: self._search(spec, text, first_positions)
+                for spec in self._specs[side].values()
+            }
+            if self.persistent_cache is not None:
+                self.persistent_cache.set_spans(
+                    parse,
+                    side,
+                    {name: m and m.span() for name, m in result.items()},
+                )
+        parse.setting_matches[(self, side)] = result
+        return result
+
+    def _cached_matches(
+        self, side: str, text: str
+    ) -> Optional[Dict[str, Optional[SettingMatch]]]:
+        return template_parse(text).setting_matches.get((self, side))
+
+    def _stored_matches(
+        self, parse: TemplateParse, side: str
+    ) -> Optional[Dict[str, Optional[SettingMatch]]]:
+        if self.persistent_cache is None:
+            return None
+        spans = self.persistent_cache.spans(parse, side)
+        if spans is None or spans.keys() != self._specs[side].keys():
+            return None
+        return {
+            name: span and SectionMatch(parse.text, *span)
+            for name, span in spans.items()
+        }
+
+    def _search(
+        self, spec: SettingSpec, text: str, first_positions: Dict[str, int]
+    ) -> Optional[SettingMatch]:
+        anchors = self._anchors[spec.name]
+        if anchors is None:
+            return spec.search(text)
+
+        starts = [
+            first_positions[literal] - max_prefix
+            for literal, max_prefix in anchors
+            if literal in first_positions
+        ]
+        if not starts:
+            # every match contains one of the anchors
+            return None
+        # no match can start before this, so the first match is the same
+        return spec.search(text, max(0, min(starts)))
+
+    def _scan_anchors(self, side: str, text: str) -> Dict[str, int]:
+        # returns the position of the first occurrence of each anchor in the text
+        # (str.find is a lot faster than one regex matching all anchors)
+        result: Dict[str, int] = dict()
+        for literal in self._side_anchors[side]:
+            pos = text.find(literal)
+            if pos != -1:
+                result[literal] = pos
+        return result
+
+
+class SectionMatch:
+    """A section of a setting found by a previous search, has the span and group methods
+    of re.Match."""
+
+    __slots__ = ("string", "_start", "_end")
+
+    def __init__(self, string: str, start: int, end: int):
+        self.string = string
+        self._start = start
+        self._end = end
+
+    def span(self) -> Tuple[int, int]:
+        return self._start, self._end
+
+    def start(self) -> int:
+        return self._start
+
+    def end(self) -> int:
+        return self._end
+
+    def group(self, index: int = 0) -> str:
+        assert index == 0, "stored sections have no groups"
+        return self.string[self._start : self._end]
+
+
+def _anchors(pattern: re.Pattern) -> Optional[List[Anchor]]:
+    # Returns literals of which every match of the pattern contains at least one,
+    # or None if there are none (then the pattern is always run).
+    if pattern.flags & re.IGNORECASE:
+        return None
+    try:
+        parsed = sre_parse.parse(pattern.pattern, pattern.flags)
+    except Exception:
+        return None
+    return _sequence_anchors(parsed, list(parsed), 0)
+
+
+def _sequence_anchors(
+    parsed, items: list, prefix_width: int
+) -> Optional[List[Anchor]]:
+    # the candidate with the shortest literal being the longest is the best
+    best: Optional[List[Anchor]] = None
+
+    def consider(candidate: Optional[List[Anchor]]):
+        nonlocal best
+        if not candidate:
+            return
+        if best is None or min(len(x) for x, _ in candidate) > min(
+            len(x) for x, _ in best
+        ):
+            best = candidate
+
+    literal = ""
+    literal_start = prefix_width
+    for op, av in items:
+        if op is sre_parse.LITERAL:
+            if not literal:
+                literal_start = prefix_width
+            literal += chr(av)
+        else:
+            consider([(literal, literal_start)] if literal else None)
+            literal = ""
+
+            if op is sre_parse.SUBPATTERN:
+                _, add_flags, _, sub_items = av
+                if not add_flags & re.IGNORECASE:
+                    consider(
+                        _sequence_anchors(parsed, list(sub_items), prefix_width)
+                    )
+            elif op is sre_parse.BRANCH:
+                branches = [
+                    _sequence_anchors(parsed, list(branch), prefix_width)
+                    for branch in av[1]
+                ]
+                if all(branches):
+                    consider([anchor for branch in branches for anchor in branch])
+            elif op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT):
+                min_repeat, _, sub_items = av
+                if min_repeat >= 1:
+                    consider(
+                        _sequence_anchors(parsed, list(sub_items), prefix_width)
+                    )
+
+        _, max_width = sre_parse.SubPattern(parsed.state, [(op, av)]).getwidth()
+        prefix_width += max_width
+
+    consider([(literal, literal_start)] if literal else None)
+    return best
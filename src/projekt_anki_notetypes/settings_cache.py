@@ -0,0 +1,193 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from copy import deepcopy
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+from .notetype_setting_definitions import setting_configs
+from .template_parse import TemplateParse
+
+# has to be increased when the layout of the cache file changes
+SETTINGS_CACHE_FORMAT_VERSION = 1
+SETTINGS_CACHE_FILE_NAME = "settings_cache.json"
+
+Span = Tuple[int, int]
+
+
+class SettingsParseCache:
+    """Persists the sections (spans) and values of the settings found in template texts,
+    so that the settings of notetypes don't have to be searched for again after Anki
+    was restarted.
+
+    The entries are keyed by the sha256 of the text. The whole cache is dropped when it
+    was written for another version, because the settings could be found differently
+    then. Only the max_entries most recently used texts are kept.
+    The file is read when the cache is first used and only written by save.
+    The cache can be used from background threads."""
+
+    def __init__(self, path: Path, version: str, max_entries: int = 512):
+        self.path = path
+        self.version = version
+        self.max_entries = max_entries
+        # sha256 of text -> {"spans": side -> setting name -> [start, end] or None,
+        #                    "values": setting name -> value}
+        self._entries: Optional["OrderedDict[str, Dict[str, Any]]"] = None
+        self._changed = False
+        self._lock = threading.RLock()
+
+    def spans(
+        self, parse: TemplateParse, side: str
+    ) -> Optional[Dict[str, Optional[Span]]]:
+        with self._lock:
+            spans = self._entry(parse)["spans"].get(side)
+            if not isinstance(spans, dict):
+                return None
+            result: Dict[str, Optional[Span]] = dict()
+            for setting_name, span in spans.items():
+                if span is None:
+                    result[setting_name] = None
+                elif _is_span(span, len(parse.text)):
+                    result[setting_name] = (span[0], span[1])
+                else:
+                    return None
+            return result
+
+    def set_spans(
+        self, parse: TemplateParse, side: str, spans: Dict[str, Optional[Span]]
+    ) -> None:
+        with self._lock:
+            self._entry(parse)["spans"][side] = {
+                setting_name: None if span is None else [span[0], span[1]]
+                for setting_name, span in spans.items()
+            }
+            self._changed = True
+
+    def value(self, parse: TemplateParse, setting_name: str, default: Any) -> Any:
+        with self._lock:
+            values = self._entry(parse)["values"]
+            return deepcopy(values[setting_name]) if setting_name in values else default
+
+    def set_value(self, parse: TemplateParse, setting_name: str, value: Any) -> None:
+        # copied because the values are lists for some settings
+        with self._lock:
+            self._entry(parse)["values"][setting_name] = deepcopy(value)
+            self._changed = True
+
+    def save(self) -> None:
+        with self._lock:
+            if not self._changed or self._entries is None:
+                return
+
+            data = {
+                "format": SETTINGS_CACHE_FORMAT_VERSION,
+                "version": self.version,
+                "entries": self._entries,
+            }
+            # written to a temporary file first, so that the cache file is never
+            # half written
+            temp_path = self.path.with_name(self.path.name + ".tmp")
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                with open(temp_path, "w", encoding="utf-8") as f:
+                    json.dump(data, f, separators=(",", ":"))
+                os.replace(temp_path, self.path)
+            except (OSError, TypeError, ValueError) as e:
+                print(f"failed saving settings cache: {e}")
+                return
+            self._changed = False
+
+    def _entry(self, parse: TemplateParse) -> Dict[str, Any]:
+        entries = self._get_entries()
+        key = parse.content_hash()
+        entry = entries.get(key)
+        if (
+            not isinstance(entry, dict)
+            or not isinstance(entry.get("spans"), dict)
+            or not isinstance(entry.get("values"), dict)
+        ):
+            entry = {"spans": dict(), "values": dict()}
+            entries[key] = entry
+            if len(entries) > self.max_entries:
+                entries.popitem(last=False)
+        else:
+            entries.move_to_end(key)
+        return entry
+
+    def _get_entries(self) -> "OrderedDict[str, Dict[str, Any]]":
+        if self._entries is None:
+            self._entries = self._load()
+        return self._entries
+
+    def _load(self) -> "OrderedDict[str, Dict[str, Any]]":
+        if not self.path.exists():
+            return OrderedDict()
+
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            # a broken cache is ignored and overwritten on the next save
+            print(f"failed loading settings cache: {e}")
+            return OrderedDict()
+
+        if (
+            not isinstance(data, dict)
+            or data.get("format") != SETTINGS_CACHE_FORMAT_VERSION
+            or data.get("version") != self.version
+            or not isinstance(data.get("entries"), dict)
+        ):
+            return OrderedDict()
+        result = OrderedDict(data["entries"])
+        while len(result) > self.max_entries:
+            result.popitem(last=False)
+        return result
+
+
+def _is_span(span: Any, text_length: int) -> bool:
+    return (
+        isinstance(span, list)
+        and len(span) == 2
+        and all(isinstance(x, int) for x in span)
+        and 0 <= span[0] <= span[1] <= text_length
+    )
+
+
+_settings_cache: Optional[SettingsParseCache] = None
+_settings_cache_args: Optional[Tuple[Path, str]] = None
+_settings_cache_lock = threading.Lock()
+
+
+def enable_settings_cache(path: Path, addon_version: str) -> None:
+    # called when the add-on is loaded, the cache is only used in Anki
+    global _settings_cache, _settings_cache_args
+    _settings_cache = None
+    _settings_cache_args = (path, addon_version)
+
+
+def settings_cache() -> Optional[SettingsParseCache]:
+    # returns None if the cache is not enabled
+    global _settings_cache
+    with _settings_cache_lock:
+        if _settings_cache is None and _settings_cache_args is not None:
+            path, addon_version = _settings_cache_args
+            _settings_cache = SettingsParseCache(
+                path, version=f"{addon_version}-{_setting_configs_hash()}"
+            )
+        return _settings_cache
+
+
+def save_settings_cache() -> None:
+    if _settings_cache is not None:
+        _settings_cache.save()
+
+
+def _setting_configs_hash() -> str:
+    # the configs of the configurable fields are generated from the shipped notetypes,
+    # so they can change without the add-on version changing
+    configs = json.dumps(
+        dict(setting_configs.items()), sort_keys=True, ensure_ascii=False, default=str
+    )
+    return hashlib.sha256(configs.encode("utf-8")).hexdigest()[:16]
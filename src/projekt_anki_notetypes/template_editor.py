@@ -0,0 +1,93 @@
+from typing import List, Optional, Tuple
+
+
+class OverlappingEditException(Exception):
+    pass
+
+
+class TemplateEditor:
+    """Collects edits of a template text and builds the edited text with one join.
+
+    All positions refer to the original text. Edits can't overlap each other or a
+    reserved span, use overlaps to check before adding an edit."""
+
+    def __init__(self, text: str):
+        self.original_text = text
+        # (start, end, replacement), sorted by start
+        self._edits: List[Tuple[int, int, str]] = []
+        # spans other edits are not allowed to touch, (start, end)
+        self._reserved: List[Tuple[int, int]] = []
+        self._text: Optional[str] = None
+
+    def overlaps(self, start: int, end: int) -> bool:
+        # spans that only touch count as overlapping too, because the order of
+        # an insertion at the end of one span and an edit of the next would be unclear
+        return any(
+            start <= other_end and other_start <= end
+            for other_start, other_end in self._reserved
+        )
+
+    def reserve(self, start: int, end: int) -> None:
+        self._reserved.append((start, end))
+
+    def replace(self, start: int, end: int, replacement: str) -> None:
+        # raises OverlappingEditException if the span overlaps another edit
+        if any(
+            start <= other_end and other_start <= end
+            for other_start, other_end, _ in self._edits
+        ):
+            raise OverlappingEditException(
+                f"edit of {start}-{end} overlaps another edit"
+            )
+        self._edits.append((start, end, replacement))
+        self._edits.sort()
+        self._text = None
+
+    def has_edits(self) -> bool:
+        return bool(self._edits)
+
+    def text(self) -> str:
+        if self._text is None:
+            parts = []
+            pos = 0
+            for start, end, replacement in self._edits:
+                parts.append(self.original_text[pos:start])
+                parts.append(replacement)
+                pos = end
+            parts.append(self.original_text[pos:])
+            self._text = "".join(parts)
+        return self._text
+
+
+def minimal_edit(old: str, new: str) -> Tuple[int, int, str]:
+    """Returns (start, end, replacement) so that replacing old[start:end] with
+    replacement turns old into new, with the span being as small as possible."""
+    max_len = min(len(old), len(new))
+
+    prefix_len = _common_length(old, new, max_len, from_end=False)
+    suffix_len = _common_length(old, new, max_len - prefix_len, from_end=True)
+    return prefix_len, len(old) - suffix_len, new[prefix_len : len(new) - suffix_len]
+
+
+def _common_length(a: str, b: str, max_len: int, from_end: bool) -> int:
+    # length of the common prefix (or suffix) of a and b, compares whole chunks at once
+    # because the strings can be whole templates
+    result = 0
+    chunk_size = 1024
+    while result < max_len:
+        size = min(chunk_size, max_len - result)
+        if from_end:
+            same = a[len(a) - result - size : len(a) - result] == b[
+                len(b) - result - size : len(b) - result
+            ]
+        else:
+            same = a[result : result + size] == b[result : result + size]
+        if same:
+            result += size
+        elif size == 1:
+            break
+        else:
+            chunk_size = max(1, size // 2)
+            continue
+        chunk_size *= 2
+    return result
@@ -0,0 +1,86 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from .field_blocks import FieldBlockTree
+
+
+class TemplateParse:
+    """The structural parse of a template text or the css of a notetype: the sections of
+    the settings and the conditional field blocks.
+    Every part is parsed when it is first needed.
+
+    Use template_parse(text) to get the parse of a text. Texts with the same content share
+    one parse, e.g. the templates of the shipped notetype version and of the copies of
+    the notetype in the collection."""
+
+    __slots__ = (
+        "text",
+        "setting_matches",
+        "_content_hash",
+        "_field_blocks",
+    )
+
+    def __init__(self, text: str):
+        self.text = text
+        # results of SettingLocator.matches, (locator, side) -> spec name -> match
+        self.setting_matches: Dict[Tuple[Any, str], Dict[str, Any]] = dict()
+        self._content_hash: Optional[str] = None
+        self._field_blocks: Optional[FieldBlockTree] = None
+
+    def content_hash(self) -> str:
+        # sha256 of the text, used as key where the text is stored (see settings_cache.py)
+        if self._content_hash is None:
+            self._content_hash = hashlib.sha256(self.text.encode("utf-8")).hexdigest()
+        return self._content_hash
+
+    def field_blocks(self) -> FieldBlockTree:
+        if self._field_blocks is None:
+            self._field_blocks = FieldBlockTree(self.text)
+        return self._field_blocks
+
+
+class TemplateParseCache:
+    """Keeps the parses of the most recently used texts.
+
+    The texts themselves are the keys, python caches the hash of a string, so looking up
+    the same string object again is cheap and a different object with the same content
+    is only compared once. The cache can be used from background threads."""
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        # hits: parse was reused, misses: a new parse was created
+        self.hits = 0
+        self.misses = 0
+        self._parses: "OrderedDict[str, TemplateParse]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, text: str) -> TemplateParse:
+        with self._lock:
+            parse = self._parses.get(text)
+            if parse is not None:
+                self.hits += 1
+                self._parses.move_to_end(text)
+                return parse
+
+            self.misses += 1
+            parse = TemplateParse(text)
+            self._parses[text] = parse
+            if len(self._parses) > self.max_entries:
+                self._parses.popitem(last=False)
+            return parse
+
+    def clear(self) -> None:
+        with self._lock:
+            self._parses.clear()
+
+    def __len__(self) -> int:
+        return len(self._parses)
+
+
+template_parses = TemplateParseCache()
+
+
+def template_parse(text: str) -> TemplateParse:
+    return template_parses.get(text)
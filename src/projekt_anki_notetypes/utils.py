@@ -1,3 +1,5 @@
+import hashlib
+import json
 import re
 import time
 from copy import deepcopy
@@ -43,6 +45,32 @@ def update_notetype_to_newest_version(
     model.update(new_model)
 
 
+def notetype_fingerprint(model: "NotetypeDict") -> str:
+    """Returns a hash of the contents of the model, without the modification time and
+    usn. If the fingerprint didn't change, the model doesn't have to be written to the
+    collection again."""
+    result = hashlib.sha256()
+    # the texts are hashed one by one, so that they are not copied into the json
+    texts = [model["css"]]
+    for template in model["tmpls"]:
+        texts.append(template["qfmt"])
+        texts.append(template["afmt"])
+    for text in texts:
+        result.update(hashlib.sha256(text.encode("utf-8")).digest())
+
+    other = {
+        key: value
+        for key, value in model.items()
+        if key not in ("css", "tmpls", "mod", "usn")
+    }
+    other["tmpls"] = [
+        {key: value for key, value in template.items() if key not in ("qfmt", "afmt")}
+        for template in model["tmpls"]
+    ]
+    result.update(json.dumps(other, sort_keys=True, default=str).encode("utf-8"))
+    return result.hexdigest()
+
+
 def _retain_ankihub_modifications(
     old_model: "NotetypeDict", new_model: "NotetypeDict"
 ) -> "NotetypeDict":
@@ -0,0 +1,105 @@
+import unittest
+from unittest import mock
+
+from src.projekt_anki_notetypes.ankiaddonconfig import manager
+from src.projekt_anki_notetypes.ankiaddonconfig.manager import ConfigManager
+
+
+def _config_manager(config, flat=False):
+    with mock.patch.object(manager, "mw") as mw:
+        mw.addonManager.getConfig.return_value = config
+        return ConfigManager(flat=flat)
+
+
+class TestConfigManagerHooks(unittest.TestCase):
+    def setUp(self):
+        self.conf = _config_manager({"general": {"a": 1, "b": 1}, "X": {"a": 1}})
+        self.calls = []
+
+    def _hook(self, key, value):
+        self.calls.append((key, value))
+
+    def test_key_and_prefix_hooks(self):
+        self.conf.on_change(self._hook, key="general.a")
+        self.conf.on_change(
+            lambda key, value: self.calls.append(("X", key)), prefix="X"
+        )
+        self.conf.set("general.a", 2)
+        self.conf.set("general.b", 2)
+        self.conf.set("X.a", 2)
+        self.assertEqual(self.calls, [("general.a", 2), ("X", "X.a")])
+
+        self.conf.remove_on_change_hook(self._hook)
+        self.conf.set("general.a", 3)
+        self.assertEqual(len(self.calls), 2)
+
+    def test_batch(self):
+        self.conf.on_change(self._hook)
+        refreshes = []
+
+        def refresh():
+            refreshes.append(list(self.calls))
+
+        with self.conf.batch():
+            self.conf.set("general.a", 2)
+            self.conf.set("general.a", 3)
+            # changed back, no hook call
+            self.conf.set("general.b", 2)
+            self.conf.set("general.b", 1)
+            with self.conf.batch():
+                self.conf.set("X.a", 2)
+            for _ in range(3):
+                self.conf.run_after_batch(refresh)
+            self.assertEqual(self.calls, [])
+        self.assertEqual(self.calls, [("general.a", 3), ("X.a", 2)])
+        # called once, after the hooks
+        self.assertEqual(refreshes, [self.calls])
+
+    def test_changes_made_by_hooks_in_batch(self):
+        def copy_to_x(key, value):
+            with self.conf.batch():
+                self.conf.set("X.a", value)
+
+        self.conf.on_change(copy_to_x, key="general.a")
+        self.conf.on_change(self._hook, prefix="X")
+        with self.conf.batch():
+            self.conf.set("general.a", 5)
+        self.assertEqual(self.calls, [("X.a", 5)])
+
+
+class TestFlatConfigManager(unittest.TestCase):
+    def setUp(self):
+        self.conf = _config_manager(
+            {"general": {"a": 1}, "X": {"a": [1, 2], "b": {"c": 3}}}, flat=True
+        )
+
+    def test_get_set_pop(self):
+        self.assertEqual(self.conf.get("X.b.c"), 3)
+        self.assertEqual(self.conf.get("X"), {"a": [1, 2], "b": {"c": 3}})
+        self.assertEqual(self.conf.get("X.d", "default"), "default")
+        self.assertNotIn("X.d", self.conf)
+
+        self.conf.set("X.b", {"d": 4})
+        self.conf.set("Y.a", 5)
+        self.assertEqual(self.conf.get("X.b"), {"d": 4})
+        self.assertEqual(self.conf.pop("general"), {"a": 1})
+        self.assertEqual(
+            self.conf.copy(), {"X": {"a": [1, 2], "b": {"d": 4}}, "Y": {"a": 5}}
+        )
+
+    def test_snapshot(self):
+        snapshot = self.conf.snapshot()
+        self.assertEqual(self.conf.changed_keys(snapshot), set())
+
+        self.conf.set("general.a", 2)
+        self.conf.set("X.e", 5)
+        self.assertEqual(snapshot.get("general.a"), 1)
+        self.assertEqual(self.conf.changed_keys(snapshot), {"general.a", "X.e"})
+        self.assertEqual(self.conf.changed_keys(snapshot, prefix="X."), {"X.e"})
+
+        self.conf.restore(snapshot)
+        self.assertEqual(self.conf.get("general.a"), 1)
+        self.assertNotIn("X.e", self.conf)
+        # the snapshot is not changed by changes after restoring it
+        self.conf.set("general.a", 3)
+        self.assertEqual(snapshot.get("general.a"), 1)
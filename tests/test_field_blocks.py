@@ -0,0 +1,60 @@
+import unittest
+
+from src.projekt_anki_notetypes.field_blocks import FieldBlockTree
+from src.projekt_anki_notetypes.notetype_setting_spec import SettingSpec
+from src.projekt_anki_notetypes.template_parse import template_parse
+
+TEXT = """
+{{#Quelle}}<div class="hints">{{Quelle}}{{#Datum}} {{Datum}}{{/Datum}}</div>{{/Quelle}}
+<!-- {{#Extra}}<div id="extra">{{Extra}}</div>{{/Extra}} -->
+{{^Bild}}{{#Klinik}}<div class="hints">{{Klinik}}</div>{{/Klinik}}{{/Bild}}
+<span class="x">PSEUDO-FIELD #AMBOSS</span>amboss<span>PSEUDO-FIELD /AMBOSS</span>
+{{#Unclosed}}
+"""
+
+
+class TestFieldBlocks(unittest.TestCase):
+    def test_nested_blocks(self):
+        tree = FieldBlockTree(TEXT)
+        quelle = tree.find("Quelle")
+        # the block ends at its own closing tag, not at the one of the nested block
+        self.assertTrue(quelle.group(0).endswith("</div>{{/Quelle}}"))
+        self.assertEqual([block.name for block in quelle.children], ["Datum"])
+        self.assertEqual(tree.find("Datum").group(0), "{{#Datum}} {{Datum}}{{/Datum}}")
+
+    def test_disabled_block_includes_comment(self):
+        extra = FieldBlockTree(TEXT).find("Extra")
+        self.assertTrue(extra.group(0).startswith("<!-- {{#Extra}}"))
+        self.assertTrue(extra.group(0).endswith("{{/Extra}} -->"))
+
+    def test_conditional_fields(self):
+        tree = FieldBlockTree(TEXT)
+        # inverted blocks are looked into, unclosed blocks are dropped
+        self.assertEqual(
+            [block.name for block in tree.conditional_fields()],
+            ["Quelle", "Extra", "Klinik", "AMBOSS"],
+        )
+        self.assertIsNone(tree.find("Bild"))
+        self.assertIsNone(tree.find("Unclosed"))
+
+    def test_pseudo_field(self):
+        amboss = FieldBlockTree(TEXT).find("AMBOSS")
+        self.assertEqual(
+            amboss.group(0),
+            '<span class="x">PSEUDO-FIELD #AMBOSS</span>amboss<span>PSEUDO-FIELD /AMBOSS</span>',
+        )
+
+    def test_spec_with_conditional_field(self):
+        spec = SettingSpec(
+            {
+                "name": "disable_klinik",
+                "type": "wrap_checkbox",
+                "file": "back",
+                "conditional_field": "Klinik",
+                "wrap_into": ("<!--", "-->"),
+            }
+        )
+        self.assertIsNone(spec.regex)
+        self.assertIs(
+            spec.search(TEXT), template_parse(TEXT).field_blocks().find("Klinik")
+        )
@@ -6,12 +6,14 @@ from pathlib import Path
 from src.projekt_anki_notetypes.gui.config_window import ntss_for_model
 from src.projekt_anki_notetypes.notetype_setting import (  # pylint: disable=unused-import
     NotetypeSetting,
+    apply_settings,
 )
 from src.projekt_anki_notetypes.notetype_setting_definitions import (
     ANKIMOBILE_USER_ACTIONS,
     projekt_anki_notetype_model,
     projekt_anki_notetype_names,
 )
+from src.projekt_anki_notetypes.utils import notetype_fingerprint
 
 try:
     from anki.models import NotetypeDict  # type: ignore pylint: disable=unused-import
@@ -51,6 +53,76 @@ class TestNotetypeSettingManipulation(unittest.TestCase):
                         msg=f"{model['name']}.{nts.config['name']}",
                     )
 
+    def test_apply_settings(self):
+        for notetype_name, model in (
+            (name, projekt_anki_notetype_model(name))
+            for name in projekt_anki_notetype_names()
+        ):
+            ntss = ntss_for_model(model)
+            conf = {
+                nts.key(notetype_name): _test_values(nts, model)[-1] for nts in ntss
+            }
+
+            expected = deepcopy(model)
+            for nts in ntss:
+                expected = nts.updated_model(expected, notetype_name, conf)
+
+            exceptions = apply_settings(
+                model, {nts.name(): conf[nts.key(notetype_name)] for nts in ntss}
+            )
+            self.assertEqual(exceptions, [])
+            self.assertEqual(model, expected, msg=notetype_name)
+
+    def test_apply_settings_custom_user_action(self):
+        model = next(
+            model
+            for model in map(projekt_anki_notetype_model, projekt_anki_notetype_names())
+            if "user_action_1" in [nts.name() for nts in ntss_for_model(model)]
+        )
+        expected = deepcopy(model)
+        # custom user actions can't be written and are kept as they are
+        exceptions = apply_settings(
+            model, {"user_action_1": "custom", "user_action_2": "custom"}
+        )
+        self.assertEqual(exceptions, [])
+        self.assertEqual(model, expected)
+
+    def test_ntss_for_model_follows_template_changes(self):
+        model = projekt_anki_notetype_model("ProjektAnkiBasic")
+        names = [nts.name() for nts in ntss_for_model(model)]
+        self.assertIn("toggle_next_button", names)
+        self.assertEqual([nts.name() for nts in ntss_for_model(model)], names)
+
+        # the model is changed without its mod changing, like in the card layout window
+        afmts = [template["afmt"] for template in model["tmpls"]]
+        for template in model["tmpls"]:
+            template["afmt"] = template["afmt"].replace(
+                "ToggleNextButtonShortcut", "Removed"
+            )
+        self.assertNotIn(
+            "toggle_next_button", [nts.name() for nts in ntss_for_model(model)]
+        )
+
+        # the model is changed back and saved
+        for template, afmt in zip(model["tmpls"], afmts):
+            template["afmt"] = afmt
+        model["mod"] += 1
+        self.assertEqual([nts.name() for nts in ntss_for_model(model)], names)
+
+    def test_notetype_fingerprint(self):
+        model = projekt_anki_notetype_model("ProjektAnkiBasic")
+        fingerprint = notetype_fingerprint(model)
+
+        # applying the current values doesn't change the model
+        ntss = ntss_for_model(model)
+        apply_settings(model, {nts.name(): nts.setting_value(model) for nts in ntss})
+        model["mod"] = 1
+        model["usn"] = -1
+        self.assertEqual(notetype_fingerprint(model), fingerprint)
+
+        model["tmpls"][0]["afmt"] += " "
+        self.assertNotEqual(notetype_fingerprint(model), fingerprint)
+
 
 def config(model: "NotetypeDict"):
     result = dict()
@@ -0,0 +1,166 @@
+import json
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+from src.projekt_anki_notetypes.notetype_bundle import BUNDLE_FILE_NAME, write_bundle
+from src.projekt_anki_notetypes.constants import ANKIHUB_HTML_END_COMMENT
+from src.projekt_anki_notetypes.notetype_registry import (
+    NotetypeRegistry,
+    notetype_content_hashes,
+)
+
+
+FRONT = "<!-- version abc123 -->\nfront"
+
+
+class TestNotetypeRegistry(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp_dir.name)
+        folder = self.path / "Foo"
+        folder.mkdir()
+        (folder / "Front Template.html").write_text(FRONT)
+        (folder / "Back Template.html").write_text("back")
+        (folder / "Styling.css").write_text("css")
+        (folder / "Foo.json").write_text(
+            json.dumps({"name": "Foo", "tmpls": [{"qfmt": "", "afmt": ""}]})
+        )
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_files_are_read_once(self):
+        registry = NotetypeRegistry(self.path)
+        self.assertEqual(registry.names(), ["Foo"])
+        self.assertEqual(registry.templates("Foo"), (FRONT, "back", "css"))
+        misses = registry.misses
+
+        self.assertEqual(registry.names(), ["Foo"])
+        self.assertEqual(registry.templates("Foo"), (FRONT, "back", "css"))
+        self.assertEqual(registry.misses, misses)
+        self.assertEqual(registry.hits, 4)
+
+    def test_model_is_a_fresh_copy(self):
+        registry = NotetypeRegistry(self.path)
+        model = registry.model("Foo")
+        self.assertEqual(model["tmpls"][0]["qfmt"], FRONT)
+        self.assertEqual(model["css"], "css")
+
+        model["css"] = "changed"
+        model["tmpls"].append({})
+        self.assertEqual(registry.model("Foo")["css"], "css")
+        self.assertEqual(len(registry.model("Foo")["tmpls"]), 1)
+
+    def test_version_is_read_from_front_template(self):
+        registry = NotetypeRegistry(self.path)
+        self.assertEqual(registry.version("Foo"), "abc123")
+        self.assertEqual(registry.versions(), {"Foo": "abc123"})
+
+    def test_changed_file_is_reloaded(self):
+        registry = NotetypeRegistry(self.path)
+        registry.templates("Foo")
+
+        front_path = self.path / "Foo" / "Front Template.html"
+        front_path.write_text("new front")
+        stat = front_path.stat()
+        os.utime(front_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+        self.assertEqual(registry.templates("Foo")[0], "new front")
+
+    def test_touched_file_keeps_content(self):
+        registry = NotetypeRegistry(self.path)
+        front = registry.templates("Foo")[0]
+
+        front_path = self.path / "Foo" / "Front Template.html"
+        stat = front_path.stat()
+        os.utime(front_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+        self.assertIs(registry.templates("Foo")[0], front)
+
+    def test_bundle_is_used_if_up_to_date(self):
+        bundle_path = self.path / BUNDLE_FILE_NAME
+        write_bundle(
+            bundle_path,
+            self.path,
+            {
+                "Foo": {
+                    "front": "bundled front",
+                    "back": "back",
+                    "css": "css",
+                    "model": json.dumps({"tmpls": [{}]}),
+                    "version": "abc123",
+                    "configurable_fields": ["Extra"],
+                    "button_shortcuts": [["Extra", "Ctrl+1"]],
+                    "content_hashes": {"css": "abc", "templates": [["a", "b"]]},
+                }
+            },
+            [("disable_extra", {"wrap_into": ("<!--", "-->")})],
+        )
+
+        registry = NotetypeRegistry(self.path, bundle_path=bundle_path)
+        self.assertEqual(registry.templates("Foo")[0], "bundled front")
+        self.assertEqual(registry.model("Foo")["css"], "css")
+        self.assertEqual(registry.bundle().configurable_fields("Foo"), ["Extra"])
+        self.assertEqual(
+            registry.content_hashes("Foo"), {"css": "abc", "templates": [["a", "b"]]}
+        )
+        self.assertEqual(
+            registry.bundle().field_setting_configs(),
+            [("disable_extra", {"wrap_into": ("<!--", "-->")})],
+        )
+
+        # touching a file doesn't make the bundle outdated
+        back_path = self.path / "Foo" / "Back Template.html"
+        stat = back_path.stat()
+        os.utime(back_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        registry = NotetypeRegistry(self.path, bundle_path=bundle_path)
+        self.assertEqual(registry.templates("Foo")[0], "bundled front")
+
+        # the bundle is ignored when a notetype file changed since it was built,
+        # also if the length of the file stayed the same
+        back = back_path.read_text()
+        back_path.write_text(back[:-1] + ("x" if back[-1] != "x" else "y"))
+        os.utime(back_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 2 * 10**9))
+        registry = NotetypeRegistry(self.path, bundle_path=bundle_path)
+        self.assertEqual(registry.templates("Foo")[0], FRONT)
+
+    def test_release_bundle_is_not_checked(self):
+        bundle_path = self.path / BUNDLE_FILE_NAME
+        write_bundle(
+            bundle_path,
+            self.path,
+            {
+                "Foo": {
+                    "front": "bundled front",
+                    "back": "back",
+                    "css": "css",
+                    "model": json.dumps({"tmpls": [{}]}),
+                    "version": "abc123",
+                    "configurable_fields": [],
+                    "button_shortcuts": [],
+                    "content_hashes": {"css": "abc", "templates": [["a", "b"]]},
+                }
+            },
+            [],
+            record_sources=False,
+        )
+
+        (self.path / "Foo" / "Back Template.html").write_text("changed back")
+        registry = NotetypeRegistry(self.path, bundle_path=bundle_path)
+        self.assertEqual(registry.templates("Foo")[0], "bundled front")
+
+    def test_content_hashes(self):
+        registry = NotetypeRegistry(self.path)
+        model = registry.model("Foo")
+        self.assertEqual(registry.content_hashes("Foo"), notetype_content_hashes(model))
+
+        # the end comment added when a notetype is updated doesn't change the hashes
+        model["tmpls"][0]["afmt"] += f"\n\n{ANKIHUB_HTML_END_COMMENT}\n"
+        self.assertEqual(registry.content_hashes("Foo"), notetype_content_hashes(model))
+
+        model["tmpls"][0]["afmt"] = "changed back"
+        self.assertNotEqual(
+            registry.content_hashes("Foo"), notetype_content_hashes(model)
+        )
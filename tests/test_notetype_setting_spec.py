@@ -0,0 +1,32 @@
+import unittest
+
+from src.projekt_anki_notetypes.notetype_setting_spec import (
+    SettingSpec,
+    SettingSpecException,
+)
+
+
+class TestSettingSpec(unittest.TestCase):
+    def test_one_spec_per_config(self):
+        config = {"name": "foo", "type": "text", "file": "back", "regex": "a(b)"}
+        spec = SettingSpec.for_config(config)
+        self.assertIs(SettingSpec.for_config(config), spec)
+        self.assertEqual(spec.regex.search("xab").group(1), "b")
+
+    def test_broken_config_fails(self):
+        with self.assertRaises(SettingSpecException):
+            SettingSpec({"name": "foo", "type": "text", "file": "back", "regex": "("})
+        with self.assertRaises(SettingSpecException):
+            SettingSpec({"name": "foo", "type": "nope", "file": "back", "regex": ""})
+
+    def test_spec_is_immutable(self):
+        config = {"name": "bar", "type": "text", "file": "back", "regex": "a"}
+        spec = SettingSpec(config)
+        with self.assertRaises(AttributeError):
+            spec.regex = None
+        with self.assertRaises(TypeError):
+            spec.config["regex"] = "b"
+
+        # the spec keeps the config it was created from
+        config["regex"] = "b"
+        self.assertEqual(spec.config["regex"], "a")
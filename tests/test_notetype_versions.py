@@ -0,0 +1,56 @@
+import unittest
+from types import SimpleNamespace
+
+from src.projekt_anki_notetypes.notetype_versions import (
+    ANKIHUB_VERSION,
+    BASE_VERSION,
+    COPY_VERSION,
+    notetype_versions_by_base_name,
+)
+
+BASE_NAMES = ["ProjektAnkiBasic", "ProjektAnkiBasicReversed", "ProjektAnkiCloze"]
+
+
+def _names_and_ids(*names):
+    return [SimpleNamespace(id=i, name=name) for i, name in enumerate(names)]
+
+
+class TestNotetypeVersions(unittest.TestCase):
+    def test_kinds(self):
+        versions = notetype_versions_by_base_name(
+            _names_and_ids(
+                "ProjektAnkiCloze-a1B2c",
+                "Basic",
+                "ProjektAnkiCloze",
+                "ProjektAnkiCloze (Ankizin / Ankizin)",
+                "ProjektAnkiClozeOld",
+            ),
+            BASE_NAMES,
+        )
+        # in the order of the collection
+        self.assertEqual(
+            [(v.name, v.kind) for v in versions["ProjektAnkiCloze"]],
+            [
+                ("ProjektAnkiCloze-a1B2c", COPY_VERSION),
+                ("ProjektAnkiCloze", BASE_VERSION),
+                ("ProjektAnkiCloze (Ankizin / Ankizin)", ANKIHUB_VERSION),
+            ],
+        )
+        self.assertEqual(versions["ProjektAnkiBasic"], [])
+
+    def test_base_name_that_starts_with_another(self):
+        versions = notetype_versions_by_base_name(
+            _names_and_ids(
+                "ProjektAnkiBasicReversed",
+                "ProjektAnkiBasic-abcde",
+                "ProjektAnkiBasicReversed-abcde",
+            ),
+            BASE_NAMES,
+        )
+        self.assertEqual(
+            [v.name for v in versions["ProjektAnkiBasic"]], ["ProjektAnkiBasic-abcde"]
+        )
+        self.assertEqual(
+            [v.name for v in versions["ProjektAnkiBasicReversed"]],
+            ["ProjektAnkiBasicReversed", "ProjektAnkiBasicReversed-abcde"],
+        )
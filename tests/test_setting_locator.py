@@ -0,0 +1,42 @@
+import unittest
+
+from src.projekt_anki_notetypes.notetype_setting_spec import SettingSpec
+from src.projekt_anki_notetypes.setting_locator import SettingLocator
+
+TEXT = """
+var foo = 1
+<!-- {{#Extra}}extra{{/Extra}} -->
+var foobar = 2
+"""
+
+
+def spec(name, regex, file="back"):
+    return SettingSpec(
+        {"name": name, "type": "text", "file": file, "regex": regex}
+    )
+
+
+class TestSettingLocator(unittest.TestCase):
+    def test_same_result_as_search(self):
+        specs = [
+            spec("foo", r"var +foo += +(\d)"),
+            spec("foobar", r"var +foobar += +(\d)"),
+            spec("extra", r"(?:<!-- ?)?\{\{#Extra\}\}[\w\W]+?\{\{/Extra\}\}"),
+            spec("missing", r"var +missing += +(\d)"),
+            spec("no_anchor", r"(?s).*"),
+        ]
+        matches = SettingLocator(specs).matches("back", TEXT)
+        # without a previous scan of the text
+        locator = SettingLocator(specs)
+        for s in specs:
+            expected = s.regex.search(TEXT)
+            for result in (matches[s.name], locator.match(s, "back", TEXT)):
+                self.assertEqual(
+                    expected and (expected.span(), expected.groups()),
+                    result and (result.span(), result.groups()),
+                )
+
+    def test_unknown_spec(self):
+        locator = SettingLocator([])
+        s = spec("foo", r"var +foo += +(\d)")
+        self.assertEqual(locator.match(s, "back", TEXT).group(1), "1")
@@ -0,0 +1,84 @@
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+from src.projekt_anki_notetypes.notetype_setting_spec import SettingSpec
+from src.projekt_anki_notetypes.setting_locator import SectionMatch, SettingLocator
+from src.projekt_anki_notetypes.settings_cache import SettingsParseCache
+from src.projekt_anki_notetypes.template_parse import TemplateParseCache
+
+TEXT = """
+var foo = 1
+var bar = 2
+"""
+
+SPECS = [
+    SettingSpec(
+        {"name": name, "type": "text", "file": "back", "regex": regex}
+    )
+    for name, regex in (
+        ("foo", r"var +foo += +(\d)"),
+        ("missing", r"var +missing += +(\d)"),
+    )
+]
+
+
+class TestSettingsParseCache(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.path = Path(self.temp_dir.name) / "user_files" / "settings_cache.json"
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_spans_and_values_are_persisted(self):
+        parse = TemplateParseCache().get(TEXT)
+        cache = SettingsParseCache(self.path, version="1")
+        matches = SettingLocator(SPECS, persistent_cache=cache).matches("back", TEXT)
+        cache.set_value(parse, "foo", ["a", "b"])
+        cache.save()
+
+        # like after a restart of Anki
+        cache = SettingsParseCache(self.path, version="1")
+        stored = SettingLocator(SPECS, persistent_cache=cache).matches("back", TEXT)
+        self.assertIsInstance(stored["foo"], SectionMatch)
+        self.assertEqual(stored["foo"].span(), matches["foo"].span())
+        self.assertEqual(stored["foo"].group(0), "var foo = 1")
+        self.assertIsNone(stored["missing"])
+        self.assertEqual(cache.value(parse, "foo", None), ["a", "b"])
+
+    def test_other_version_is_dropped(self):
+        parse = TemplateParseCache().get(TEXT)
+        cache = SettingsParseCache(self.path, version="1")
+        cache.set_value(parse, "foo", 1)
+        cache.save()
+
+        cache = SettingsParseCache(self.path, version="2")
+        self.assertIsNone(cache.value(parse, "foo", None))
+
+    def test_corrupt_file_is_ignored(self):
+        parse = TemplateParseCache().get(TEXT)
+        self.path.parent.mkdir(parents=True)
+        self.path.write_text('{"format": 1, "entr')
+
+        cache = SettingsParseCache(self.path, version="1")
+        self.assertIsNone(cache.value(parse, "foo", None))
+        cache.set_value(parse, "foo", 1)
+        cache.save()
+        self.assertEqual(
+            SettingsParseCache(self.path, version="1").value(parse, "foo", None), 1
+        )
+
+    def test_size_cap(self):
+        parses = TemplateParseCache()
+        cache = SettingsParseCache(self.path, version="1", max_entries=2)
+        for text in ("a", "b", "c"):
+            cache.set_value(parses.get(text), "foo", text)
+        cache.save()
+
+        with open(self.path) as f:
+            self.assertEqual(len(json.load(f)["entries"]), 2)
+        cache = SettingsParseCache(self.path, version="1", max_entries=2)
+        self.assertIsNone(cache.value(parses.get("a"), "foo", None))
+        self.assertEqual(cache.value(parses.get("c"), "foo", None), "c")
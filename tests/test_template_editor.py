@@ -0,0 +1,33 @@
+import unittest
+
+from src.projekt_anki_notetypes.template_editor import (
+    OverlappingEditException,
+    TemplateEditor,
+    minimal_edit,
+)
+
+
+class TestTemplateEditor(unittest.TestCase):
+    def test_edits_are_joined(self):
+        editor = TemplateEditor("var a = 1; var b = 2;")
+        editor.replace(19, 20, "3")
+        editor.replace(8, 9, "42")
+        self.assertEqual(editor.text(), "var a = 42; var b = 3;")
+
+    def test_overlapping_edits_are_rejected(self):
+        editor = TemplateEditor("abcdef")
+        editor.replace(1, 3, "x")
+        with self.assertRaises(OverlappingEditException):
+            editor.replace(2, 4, "y")
+        # touching edits count as overlapping
+        with self.assertRaises(OverlappingEditException):
+            editor.replace(3, 3, "y")
+        self.assertEqual(editor.text(), "axdef")
+
+    def test_minimal_edit(self):
+        old = "a" * 3000 + "<b>" + "c" * 5000
+        new = "a" * 3000 + "<!--<b>-->" + "c" * 5000
+        start, end, replacement = minimal_edit(old, new)
+        self.assertEqual(old[:start] + replacement + old[end:], new)
+        self.assertLessEqual(end - start, 3)
+        self.assertEqual(minimal_edit("same", "same"), (4, 4, ""))
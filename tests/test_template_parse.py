@@ -0,0 +1,26 @@
+import unittest
+
+from src.projekt_anki_notetypes.template_parse import TemplateParseCache
+
+
+class TestTemplateParse(unittest.TestCase):
+    def test_same_content_shares_parse(self):
+        cache = TemplateParseCache()
+        text = "{{#Extra}}extra{{/Extra}}" * 2
+        # a different object with the same content, like the template of a copied notetype
+        copied_text = "".join([text[:5], text[5:]])
+        self.assertIsNot(text, copied_text)
+        self.assertIs(cache.get(text), cache.get(copied_text))
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_lru_bound(self):
+        cache = TemplateParseCache(max_entries=2)
+        first = cache.get("a")
+        cache.get("b")
+        cache.get("a")
+        cache.get("c")
+        self.assertEqual(len(cache), 2)
+        # "b" was used least recently
+        self.assertIs(cache.get("a"), first)
+        cache.get("b")
+        self.assertEqual(cache.misses, 4)